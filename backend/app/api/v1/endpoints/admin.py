@@ -1,14 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+import asyncio
+
+import orjson
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from sqlalchemy import case, func, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 from typing import List, Optional
 from datetime import datetime, timedelta
 import structlog
 
 from app.core.database import get_db
 from app.core.auth import get_current_admin_user
+from app.core.pagination import decode_cursor, encode_cursor
 from app.schemas.admin import (
-    PromptLogResponse, 
-    TenantStatsResponse, 
+    PromptLogPage,
+    PromptLogResponse,
+    TenantStatsResponse,
     UsageStatsResponse,
     SystemStatsResponse
 )
@@ -16,17 +23,15 @@ from app.models.prompt_log import PromptLog
 from app.models.tenant import Tenant
 from app.models.user import User
 from app.models.conversation import Conversation
-from app.services.rag_service import RAGService
+from app.services.rag_service import rag_service
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-rag_service = RAGService()
-
-@router.get("/prompt-logs", response_model=List[PromptLogResponse])
+@router.get("/prompt-logs", response_model=PromptLogPage)
 async def get_prompt_logs(
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user),
     tenant_id: Optional[int] = None,
     user_id: Optional[int] = None,
@@ -34,110 +39,164 @@ async def get_prompt_logs(
     start_date: Optional[datetime] = None,
     end_date: Optional[datetime] = None,
     limit: int = 100,
-    offset: int = 0
+    cursor: Optional[str] = None
 ):
     """Get prompt logs for administrative monitoring"""
-    
-    query = db.query(PromptLog)
-    
+
+    # List view: skip the heavy text bodies and return 200-char
+    # previews truncated in the database; get_prompt_log serves the
+    # full detail
+    query = select(
+        PromptLog.id,
+        PromptLog.tenant_id,
+        PromptLog.user_id,
+        func.substr(PromptLog.prompt_text, 1, 200).label("prompt_text"),
+        func.substr(PromptLog.response_text, 1, 200).label("response_text"),
+        PromptLog.model_used,
+        PromptLog.input_tokens,
+        PromptLog.output_tokens,
+        PromptLog.total_tokens,
+        PromptLog.latency_ms,
+        PromptLog.cost_usd,
+        PromptLog.request_id,
+        PromptLog.status_code,
+        PromptLog.error_message,
+        PromptLog.created_at
+    )
+
     # Filter by tenant if specified
     if tenant_id:
-        query = query.filter(PromptLog.tenant_id == tenant_id)
-    
+        query = query.where(PromptLog.tenant_id == tenant_id)
+
     # Filter by user if specified
     if user_id:
-        query = query.filter(PromptLog.user_id == user_id)
-    
+        query = query.where(PromptLog.user_id == user_id)
+
     # Filter by model if specified
     if model:
-        query = query.filter(PromptLog.model_used == model)
-    
+        query = query.where(PromptLog.model_used == model)
+
     # Filter by date range
     if start_date:
-        query = query.filter(PromptLog.created_at >= start_date)
+        query = query.where(PromptLog.created_at >= start_date)
     if end_date:
-        query = query.filter(PromptLog.created_at <= end_date)
-    
+        query = query.where(PromptLog.created_at <= end_date)
+
+    # Keyset pagination: seek past the cursor position instead of
+    # scanning and discarding OFFSET rows
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(PromptLog.created_at, PromptLog.id) < (cursor_ts, cursor_id)
+        )
+
     # Order by most recent first
-    query = query.order_by(PromptLog.created_at.desc())
-    
-    # Apply pagination
-    logs = query.offset(offset).limit(limit).all()
-    
-    return [
-        PromptLogResponse(
-            id=log.id,
-            tenant_id=log.tenant_id,
-            user_id=log.user_id,
-            prompt_text=log.prompt_text,
-            response_text=log.response_text,
-            model_used=log.model_used,
-            input_tokens=log.input_tokens,
-            output_tokens=log.output_tokens,
-            total_tokens=log.total_tokens,
-            latency_ms=log.latency_ms,
-            cost_usd=log.cost_usd,
-            request_id=log.request_id,
-            status_code=log.status_code,
-            error_message=log.error_message,
-            created_at=log.created_at
+    query = query.order_by(PromptLog.created_at.desc(), PromptLog.id.desc())
+
+    result = await db.execute(query.limit(limit))
+    logs = result.all()
+
+    next_cursor = None
+    if len(logs) == limit:
+        next_cursor = encode_cursor(logs[-1].created_at, logs[-1].id)
+
+    # Serialize straight to orjson: skips the per-row Pydantic model
+    # construction and the stdlib-json encode pass
+    def build_payload() -> bytes:
+        items = [
+            {
+                "id": log.id,
+                "tenant_id": log.tenant_id,
+                "user_id": log.user_id,
+                "prompt_text": log.prompt_text,
+                "response_text": log.response_text,
+                "model_used": log.model_used,
+                "input_tokens": log.input_tokens,
+                "output_tokens": log.output_tokens,
+                "total_tokens": log.total_tokens,
+                "latency_ms": log.latency_ms,
+                "cost_usd": log.cost_usd,
+                "request_id": log.request_id,
+                "status_code": log.status_code,
+                "error_message": log.error_message,
+                "created_at": log.created_at
+            }
+            for log in logs
+        ]
+        return orjson.dumps({"items": items, "next_cursor": next_cursor})
+
+    # Large dumps are CPU-bound enough to stall the event loop; push
+    # them to the executor so concurrent chat requests keep moving
+    if len(logs) > 50:
+        payload = await asyncio.get_running_loop().run_in_executor(
+            None, build_payload
         )
-        for log in logs
-    ]
+    else:
+        payload = build_payload()
+
+    return Response(content=payload, media_type="application/json")
 
 @router.get("/tenant-stats", response_model=List[TenantStatsResponse])
 async def get_tenant_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Get statistics for all tenants"""
-    
-    tenants = db.query(Tenant).all()
-    stats = []
-    
-    for tenant in tenants:
-        # Get user count
-        user_count = db.query(User).filter(User.tenant_id == tenant.id).count()
-        
-        # Get conversation count
-        conversation_count = db.query(Conversation).filter(
-            Conversation.tenant_id == tenant.id
-        ).count()
-        
-        # Get prompt log count
-        prompt_count = db.query(PromptLog).filter(
-            PromptLog.tenant_id == tenant.id
-        ).count()
-        
-        # Get total cost
-        total_cost = db.query(PromptLog).filter(
-            PromptLog.tenant_id == tenant.id,
-            PromptLog.cost_usd.isnot(None)
-        ).with_entities(
-            db.func.sum(PromptLog.cost_usd)
-        ).scalar() or 0
-        
-        # Get RAG stats
-        rag_stats = await rag_service.get_collection_stats(tenant.name)
-        
-        stats.append(TenantStatsResponse(
-            tenant_id=tenant.id,
-            tenant_name=tenant.name,
-            display_name=tenant.display_name,
-            is_active=tenant.is_active,
-            user_count=user_count,
-            conversation_count=conversation_count,
-            prompt_count=prompt_count,
-            total_cost=total_cost,
+
+    # Aggregate per-tenant counts in a single query using correlated
+    # scalar subqueries (avoids the 4N+1 roundtrips of per-tenant loops
+    # and the row explosion of multi-way distinct-count joins)
+    user_count_sq = select(func.count(User.id)).where(
+        User.tenant_id == Tenant.id
+    ).scalar_subquery()
+    conversation_count_sq = select(func.count(Conversation.id)).where(
+        Conversation.tenant_id == Tenant.id
+    ).scalar_subquery()
+    prompt_count_sq = select(func.count(PromptLog.id)).where(
+        PromptLog.tenant_id == Tenant.id
+    ).scalar_subquery()
+    total_cost_sq = select(func.sum(PromptLog.cost_usd)).where(
+        PromptLog.tenant_id == Tenant.id,
+        PromptLog.cost_usd.isnot(None)
+    ).scalar_subquery()
+
+    # raiseload guards against accidental lazy loads off the Tenant rows
+    result = await db.execute(
+        select(
+            Tenant,
+            user_count_sq.label("user_count"),
+            conversation_count_sq.label("conversation_count"),
+            prompt_count_sq.label("prompt_count"),
+            total_cost_sq.label("total_cost")
+        ).options(raiseload("*"))
+    )
+    rows = result.all()
+
+    # Fan out RAG stat fetches concurrently (bounded by the service's
+    # semaphore) instead of awaiting serially
+    rag_results = await rag_service.get_collection_stats_many(
+        [row.Tenant.name for row in rows]
+    )
+
+    return [
+        TenantStatsResponse(
+            tenant_id=row.Tenant.id,
+            tenant_name=row.Tenant.name,
+            display_name=row.Tenant.display_name,
+            is_active=row.Tenant.is_active,
+            user_count=row.user_count,
+            conversation_count=row.conversation_count,
+            prompt_count=row.prompt_count,
+            total_cost=row.total_cost or 0,
             rag_document_count=rag_stats.get("document_count", 0),
-            created_at=tenant.created_at
-        ))
-    
-    return stats
+            created_at=row.Tenant.created_at
+        )
+        for row, rag_stats in zip(rows, rag_results)
+    ]
 
 @router.get("/usage-stats", response_model=UsageStatsResponse)
 async def get_usage_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user),
     days: int = 30
 ):
@@ -145,50 +204,39 @@ async def get_usage_stats(
     
     end_date = datetime.utcnow()
     start_date = end_date - timedelta(days=days)
-    
-    # Total prompts
-    total_prompts = db.query(PromptLog).filter(
-        PromptLog.created_at >= start_date
-    ).count()
-    
-    # Successful prompts
-    successful_prompts = db.query(PromptLog).filter(
-        PromptLog.created_at >= start_date,
-        PromptLog.status_code == 200
-    ).count()
-    
-    # Total tokens
-    total_tokens = db.query(PromptLog).filter(
-        PromptLog.created_at >= start_date,
-        PromptLog.total_tokens.isnot(None)
-    ).with_entities(
-        db.func.sum(PromptLog.total_tokens)
-    ).scalar() or 0
-    
-    # Total cost
-    total_cost = db.query(PromptLog).filter(
-        PromptLog.created_at >= start_date,
-        PromptLog.cost_usd.isnot(None)
-    ).with_entities(
-        db.func.sum(PromptLog.cost_usd)
-    ).scalar() or 0
-    
-    # Average latency
-    avg_latency = db.query(PromptLog).filter(
-        PromptLog.created_at >= start_date,
-        PromptLog.latency_ms.isnot(None)
-    ).with_entities(
-        db.func.avg(PromptLog.latency_ms)
-    ).scalar() or 0
-    
+
+    # Fuse the scalar aggregates into one scan over the date window
+    # (SUM/AVG ignore NULLs, so no per-aggregate isnot-None filters needed)
+    result = await db.execute(
+        select(
+            func.count(PromptLog.id).label('total_prompts'),
+            func.sum(
+                case((PromptLog.status_code == 200, 1), else_=0)
+            ).label('successful_prompts'),
+            func.sum(PromptLog.total_tokens).label('total_tokens'),
+            func.sum(PromptLog.cost_usd).label('total_cost'),
+            func.avg(PromptLog.latency_ms).label('avg_latency')
+        ).where(PromptLog.created_at >= start_date)
+    )
+    totals = result.one()
+
+    total_prompts = totals.total_prompts or 0
+    successful_prompts = totals.successful_prompts or 0
+    total_tokens = totals.total_tokens or 0
+    total_cost = totals.total_cost or 0
+    avg_latency = totals.avg_latency or 0
+
     # Model usage breakdown
-    model_usage = db.query(
-        PromptLog.model_used,
-        db.func.count(PromptLog.id).label('count'),
-        db.func.sum(PromptLog.cost_usd).label('cost')
-    ).filter(
-        PromptLog.created_at >= start_date
-    ).group_by(PromptLog.model_used).all()
+    result = await db.execute(
+        select(
+            PromptLog.model_used,
+            func.count(PromptLog.id).label('count'),
+            func.sum(PromptLog.cost_usd).label('cost')
+        ).where(
+            PromptLog.created_at >= start_date
+        ).group_by(PromptLog.model_used)
+    )
+    model_usage = result.all()
     
     return UsageStatsResponse(
         period_days=days,
@@ -210,47 +258,54 @@ async def get_usage_stats(
 
 @router.get("/system-stats", response_model=SystemStatsResponse)
 async def get_system_stats(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Get overall system statistics"""
-    
-    # Total counts
-    total_tenants = db.query(Tenant).count()
-    active_tenants = db.query(Tenant).filter(Tenant.is_active == True).count()
-    total_users = db.query(User).count()
-    total_conversations = db.query(Conversation).count()
-    total_prompts = db.query(PromptLog).count()
-    
-    # Recent activity (last 24 hours)
+
     recent_cutoff = datetime.utcnow() - timedelta(hours=24)
-    recent_prompts = db.query(PromptLog).filter(
-        PromptLog.created_at >= recent_cutoff
-    ).count()
-    
-    recent_conversations = db.query(Conversation).filter(
-        Conversation.created_at >= recent_cutoff
-    ).count()
-    
+
+    # Fuse all seven COUNT(*) scans into a single roundtrip of
+    # uncorrelated scalar subqueries
+    result = await db.execute(
+        select(
+            select(func.count(Tenant.id)).scalar_subquery().label('total_tenants'),
+            select(func.count(Tenant.id)).where(
+                Tenant.is_active == True
+            ).scalar_subquery().label('active_tenants'),
+            select(func.count(User.id)).scalar_subquery().label('total_users'),
+            select(func.count(Conversation.id)).scalar_subquery().label('total_conversations'),
+            select(func.count(PromptLog.id)).scalar_subquery().label('total_prompts'),
+            select(func.count(PromptLog.id)).where(
+                PromptLog.created_at >= recent_cutoff
+            ).scalar_subquery().label('recent_prompts'),
+            select(func.count(Conversation.id)).where(
+                Conversation.created_at >= recent_cutoff
+            ).scalar_subquery().label('recent_conversations')
+        )
+    )
+    counts = result.one()
+
     return SystemStatsResponse(
-        total_tenants=total_tenants,
-        active_tenants=active_tenants,
-        total_users=total_users,
-        total_conversations=total_conversations,
-        total_prompts=total_prompts,
-        recent_prompts_24h=recent_prompts,
-        recent_conversations_24h=recent_conversations
+        total_tenants=counts.total_tenants,
+        active_tenants=counts.active_tenants,
+        total_users=counts.total_users,
+        total_conversations=counts.total_conversations,
+        total_prompts=counts.total_prompts,
+        recent_prompts_24h=counts.recent_prompts,
+        recent_conversations_24h=counts.recent_conversations
     )
 
 @router.get("/prompt-logs/{log_id}", response_model=PromptLogResponse)
 async def get_prompt_log(
     log_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Get a specific prompt log"""
-    
-    log = db.query(PromptLog).filter(PromptLog.id == log_id).first()
+
+    result = await db.execute(select(PromptLog).where(PromptLog.id == log_id))
+    log = result.scalars().first()
     if not log:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
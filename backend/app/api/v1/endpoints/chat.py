@@ -1,124 +1,204 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+import hashlib
+import json
+import uuid
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from sqlalchemy import func, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 from typing import List, Optional
 import structlog
 
-from app.core.database import get_db
+from app.core.config import settings
+from app.core.database import get_db, get_redis, SessionLocal
 from app.core.exceptions import TenantNotFoundError, RateLimitExceededError
-from app.services.ai_service import AIService
+from app.services.ai_service import AIResponse, get_ai_service
+from app.services.prompt_log_writer import prompt_log_writer
 from app.services.rate_limiter import RateLimiter
-from app.schemas.chat import ChatRequest, ChatResponse, ConversationCreate, ConversationResponse
-from app.models.tenant import Tenant
+from app.core.pagination import decode_cursor, encode_cursor
+from app.schemas.chat import (
+    ChatRequest,
+    ChatResponse,
+    ConversationCreate,
+    ConversationPage,
+    ConversationResponse
+)
 from app.models.conversation import Conversation
-from app.models.prompt_log import PromptLog
+from app.models.chat_message import ChatMessage
 from app.core.auth import get_current_user
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-ai_service = AIService()
+ai_service = get_ai_service()
 rate_limiter = RateLimiter()
+redis_client = get_redis()
 
 @router.post("/", response_model=ChatResponse)
 async def chat(
     request: ChatRequest,
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Send a message and get AI response"""
-    
+
     # Get tenant from request state
     tenant_id = getattr(req.state, "tenant_id", None)
     if not tenant_id:
         raise TenantNotFoundError("No tenant specified")
-    
-    # Get tenant from database
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+
+    # Tenant was resolved (and cached) by TenantMiddleware
+    tenant = req.state.tenant
     if not tenant:
         raise TenantNotFoundError(tenant_id)
     
     # Check rate limiting
     if not await rate_limiter.check_rate_limit(tenant_id, current_user.id):
         raise RateLimitExceededError()
-    
+
+    # Check the response cache for an identical prompt
+    cache_key = None
+    cached_response = None
+    if settings.CHAT_CACHE_ENABLED:
+        cache_key = "chat:" + hashlib.blake2b(
+            json.dumps({
+                "tenant_id": tenant_id,
+                "model": request.model or tenant.default_model,
+                "message": request.message,
+                "history": request.conversation_history,
+                "use_rag": request.use_rag,
+                "temperature": request.temperature,
+                "max_tokens": request.max_tokens
+            }, sort_keys=True).encode(),
+            digest_size=16
+        ).hexdigest()
+        cached = await redis_client.get(cache_key)
+        if cached:
+            cached_response = json.loads(cached)
+
     try:
-        # Generate AI response
-        ai_response = await ai_service.generate_response(
-            prompt=request.message,
-            model=request.model or tenant.default_model,
-            tenant_id=tenant_id,
-            user_id=current_user.id,
-            conversation_history=request.conversation_history,
-            use_rag=request.use_rag,
-            temperature=request.temperature,
-            max_tokens=request.max_tokens
-        )
-        
-        # Log the interaction
-        prompt_log = PromptLog(
-            tenant_id=tenant.id,
-            user_id=current_user.id,
-            prompt_text=request.message,
-            response_text=ai_response.content,
-            model_used=ai_response.model_used,
-            input_tokens=ai_response.input_tokens,
-            output_tokens=ai_response.output_tokens,
-            total_tokens=ai_response.total_tokens,
-            latency_ms=ai_response.latency_ms,
-            cost_usd=ai_response.cost_usd,
-            request_id=ai_response.request_id,
-            user_agent=req.headers.get("user-agent"),
-            ip_address=req.client.host if req.client else None,
-            status_code=200
-        )
-        db.add(prompt_log)
-        db.commit()
-        
-        # Create or update conversation if conversation_id provided
-        conversation = None
-        if request.conversation_id:
-            conversation = db.query(Conversation).filter(
-                Conversation.id == request.conversation_id,
-                Conversation.tenant_id == tenant.id,
-                Conversation.user_id == current_user.id
-            ).first()
-        
-        if conversation:
-            # Update existing conversation
-            conversation.messages.append({
-                "role": "user",
-                "content": request.message
-            })
-            conversation.messages.append({
-                "role": "assistant",
-                "content": ai_response.content
-            })
-            conversation.model_used = ai_response.model_used
-            conversation.temperature = request.temperature
-            conversation.max_tokens = request.max_tokens
+        if cached_response is not None:
+            # Serve from cache: no LLM call, no token spend
+            cache_hit = True
+            ai_response = AIResponse(
+                content=cached_response["content"],
+                model_used=cached_response["model_used"],
+                input_tokens=cached_response["input_tokens"],
+                output_tokens=cached_response["output_tokens"],
+                total_tokens=cached_response["total_tokens"],
+                latency_ms=0.0,
+                cost_usd=0.0,
+                request_id=str(uuid.uuid4())
+            )
         else:
+            # Generate AI response
+            cache_hit = False
+            ai_response = await ai_service.generate_response(
+                prompt=request.message,
+                model=request.model or tenant.default_model,
+                tenant_id=tenant_id,
+                user_id=current_user.id,
+                conversation_history=request.conversation_history,
+                use_rag=request.use_rag,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            )
+
+            if cache_key:
+                await redis_client.setex(
+                    cache_key,
+                    settings.CHAT_CACHE_TTL,
+                    json.dumps({
+                        "content": ai_response.content,
+                        "model_used": ai_response.model_used,
+                        "input_tokens": ai_response.input_tokens,
+                        "output_tokens": ai_response.output_tokens,
+                        "total_tokens": ai_response.total_tokens
+                    })
+                )
+
+        # Fold the ownership check into the UPDATE itself: one roundtrip
+        # in the happy path, and no SELECT-then-UPDATE race
+        conversation_id = None
+        if request.conversation_id:
+            result = await db.execute(
+                update(Conversation).where(
+                    Conversation.id == request.conversation_id,
+                    Conversation.tenant_id == tenant.id,
+                    Conversation.user_id == current_user.id
+                ).values(
+                    message_count=Conversation.message_count + 2,
+                    model_used=ai_response.model_used,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens
+                ).returning(Conversation.id, Conversation.message_count)
+            )
+            row = result.first()
+            if row:
+                conversation_id = row.id
+                # RETURNING sees the post-update count
+                next_seq = row.message_count - 1
+
+        if conversation_id is None:
             # Create new conversation
+            next_seq = 1
             conversation = Conversation(
                 tenant_id=tenant.id,
                 user_id=current_user.id,
                 title=request.message[:50] + "..." if len(request.message) > 50 else request.message,
-                messages=[
-                    {"role": "user", "content": request.message},
-                    {"role": "assistant", "content": ai_response.content}
-                ],
+                message_count=2,
                 model_used=ai_response.model_used,
                 temperature=request.temperature,
                 max_tokens=request.max_tokens
             )
             db.add(conversation)
-        
-        db.commit()
-        db.refresh(conversation)
-        
+            await db.flush()  # Assign conversation.id for the message rows
+            conversation_id = conversation.id
+
+        # Append the turn as two O(1) inserts instead of rewriting the
+        # whole history
+        db.add_all([
+            ChatMessage(
+                conversation_id=conversation_id,
+                seq=next_seq,
+                role="user",
+                content=request.message
+            ),
+            ChatMessage(
+                conversation_id=conversation_id,
+                seq=next_seq + 1,
+                role="assistant",
+                content=ai_response.content
+            )
+        ])
+
+        # Hand the interaction log to the batched background writer so
+        # the request doesn't pay for its insert
+        await prompt_log_writer.enqueue({
+            "tenant_id": tenant.id,
+            "user_id": current_user.id,
+            "prompt_text": request.message,
+            "response_text": ai_response.content,
+            "model_used": ai_response.model_used,
+            "input_tokens": ai_response.input_tokens,
+            "output_tokens": ai_response.output_tokens,
+            "total_tokens": ai_response.total_tokens,
+            "latency_ms": ai_response.latency_ms,
+            "cost_usd": ai_response.cost_usd,
+            "request_id": ai_response.request_id,
+            "user_agent": req.headers.get("user-agent"),
+            "ip_address": req.client.host if req.client else None,
+            "status_code": 200,
+            "cache_hit": cache_hit
+        })
+
+        await db.commit()
+
         return ChatResponse(
             response=ai_response.content,
-            conversation_id=conversation.id,
+            conversation_id=conversation_id,
             model_used=ai_response.model_used,
             tokens_used=ai_response.total_tokens,
             latency_ms=ai_response.latency_ms,
@@ -134,99 +214,303 @@ async def chat(
             user_id=current_user.id
         )
         
-        # Log failed request
-        prompt_log = PromptLog(
-            tenant_id=tenant.id,
-            user_id=current_user.id,
-            prompt_text=request.message,
-            model_used=request.model or tenant.default_model,
-            request_id=ai_response.request_id if 'ai_response' in locals() else None,
-            user_agent=req.headers.get("user-agent"),
-            ip_address=req.client.host if req.client else None,
-            status_code=500,
-            error_message=str(e)
-        )
-        db.add(prompt_log)
-        db.commit()
-        
+        # Discard any half-applied work and queue the failure log
+        await db.rollback()
+        await prompt_log_writer.enqueue({
+            "tenant_id": tenant.id,
+            "user_id": current_user.id,
+            "prompt_text": request.message,
+            "model_used": request.model or tenant.default_model,
+            "request_id": ai_response.request_id if 'ai_response' in locals() else None,
+            "user_agent": req.headers.get("user-agent"),
+            "ip_address": req.client.host if req.client else None,
+            "status_code": 500,
+            "error_message": str(e)
+        })
+
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to generate response"
         )
 
-@router.get("/conversations", response_model=List[ConversationResponse])
+@router.post("/stream")
+async def chat_stream(
+    request: ChatRequest,
+    req: Request,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_user)
+):
+    """Send a message and stream the AI response over SSE"""
+
+    tenant_id = getattr(req.state, "tenant_id", None)
+    if not tenant_id:
+        raise TenantNotFoundError("No tenant specified")
+
+    tenant = req.state.tenant
+    if not tenant:
+        raise TenantNotFoundError(tenant_id)
+
+    if not await rate_limiter.check_rate_limit(tenant_id, current_user.id):
+        raise RateLimitExceededError()
+
+    model = request.model or tenant.default_model
+    request_id = str(uuid.uuid4())
+    # Shared between the generator and the background writer, which only
+    # runs after the stream has completed
+    stream_state = {"content": "", "error": None}
+
+    async def event_generator():
+        try:
+            async for chunk in ai_service.stream_response(
+                prompt=request.message,
+                model=model,
+                tenant_id=tenant_id,
+                user_id=current_user.id,
+                conversation_history=request.conversation_history,
+                use_rag=request.use_rag,
+                temperature=request.temperature,
+                max_tokens=request.max_tokens
+            ):
+                stream_state["content"] += chunk
+                yield f"data: {json.dumps({'delta': chunk})}\n\n"
+            yield "data: [DONE]\n\n"
+        except Exception as e:
+            stream_state["error"] = str(e)
+            logger.error(
+                "Chat stream error",
+                error=str(e),
+                tenant_id=tenant_id,
+                user_id=current_user.id
+            )
+            yield f"data: {json.dumps({'error': 'Failed to generate response'})}\n\n"
+
+    background_tasks.add_task(
+        _persist_stream_result,
+        tenant_db_id=tenant.id,
+        user_id=current_user.id,
+        request=request,
+        model=model,
+        request_id=request_id,
+        stream_state=stream_state,
+        user_agent=req.headers.get("user-agent"),
+        ip_address=req.client.host if req.client else None
+    )
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        background=background_tasks
+    )
+
+async def _persist_stream_result(
+    tenant_db_id: int,
+    user_id: int,
+    request: ChatRequest,
+    model: str,
+    request_id: str,
+    stream_state: dict,
+    user_agent: Optional[str],
+    ip_address: Optional[str]
+):
+    """Write the PromptLog and Conversation rows after a stream finishes"""
+    content = stream_state["content"]
+    error = stream_state["error"]
+
+    async with SessionLocal() as db:
+        if error is None:
+            conversation_id = None
+            if request.conversation_id:
+                result = await db.execute(
+                    update(Conversation).where(
+                        Conversation.id == request.conversation_id,
+                        Conversation.tenant_id == tenant_db_id,
+                        Conversation.user_id == user_id
+                    ).values(
+                        message_count=Conversation.message_count + 2,
+                        model_used=model,
+                        temperature=request.temperature,
+                        max_tokens=request.max_tokens
+                    ).returning(Conversation.id, Conversation.message_count)
+                )
+                row = result.first()
+                if row:
+                    conversation_id = row.id
+                    next_seq = row.message_count - 1
+
+            if conversation_id is None:
+                next_seq = 1
+                conversation = Conversation(
+                    tenant_id=tenant_db_id,
+                    user_id=user_id,
+                    title=request.message[:50] + "..." if len(request.message) > 50 else request.message,
+                    message_count=2,
+                    model_used=model,
+                    temperature=request.temperature,
+                    max_tokens=request.max_tokens
+                )
+                db.add(conversation)
+                await db.flush()
+                conversation_id = conversation.id
+
+            db.add_all([
+                ChatMessage(
+                    conversation_id=conversation_id,
+                    seq=next_seq,
+                    role="user",
+                    content=request.message
+                ),
+                ChatMessage(
+                    conversation_id=conversation_id,
+                    seq=next_seq + 1,
+                    role="assistant",
+                    content=content
+                )
+            ])
+
+        await db.commit()
+
+    await prompt_log_writer.enqueue({
+        "tenant_id": tenant_db_id,
+        "user_id": user_id,
+        "prompt_text": request.message,
+        "response_text": content or None,
+        "model_used": model,
+        "request_id": request_id,
+        "user_agent": user_agent,
+        "ip_address": ip_address,
+        "status_code": 200 if error is None else 500,
+        "error_message": error
+    })
+
+@router.get("/conversations", response_model=ConversationPage)
 async def get_conversations(
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user),
     limit: int = 20,
-    offset: int = 0
+    cursor: Optional[str] = None
 ):
     """Get user's conversations"""
-    
+
     tenant_id = getattr(req.state, "tenant_id", None)
     if not tenant_id:
         raise TenantNotFoundError("No tenant specified")
-    
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+
+    tenant = req.state.tenant
     if not tenant:
         raise TenantNotFoundError(tenant_id)
-    
-    conversations = db.query(Conversation).filter(
+
+    # Select only the list columns; loading the messages JSON just to
+    # take its length deserializes the entire history per row
+    query = select(
+        Conversation.id,
+        Conversation.title,
+        Conversation.created_at,
+        Conversation.updated_at,
+        Conversation.message_count
+    ).where(
         Conversation.tenant_id == tenant.id,
         Conversation.user_id == current_user.id
-    ).order_by(Conversation.updated_at.desc()).offset(offset).limit(limit).all()
-    
-    return [
+    )
+
+    # Keyset pagination over (COALESCE(updated_at, created_at), id)
+    # instead of OFFSET scans; the coalesce keeps pre-server-default
+    # rows (updated_at NULL) sortable and reachable, and matches the
+    # ix_conversations_activity_id expression index
+    activity_at = func.coalesce(Conversation.updated_at, Conversation.created_at)
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        query = query.where(
+            tuple_(activity_at, Conversation.id) < (cursor_ts, cursor_id)
+        )
+
+    result = await db.execute(
+        query.order_by(activity_at.desc(), Conversation.id.desc()).limit(limit)
+    )
+    conversations = result.all()
+
+    next_cursor = None
+    if len(conversations) == limit:
+        last = conversations[-1]
+        next_cursor = encode_cursor(last.updated_at or last.created_at, last.id)
+
+    items = [
         ConversationResponse(
             id=conv.id,
             title=conv.title,
             created_at=conv.created_at,
             updated_at=conv.updated_at,
-            message_count=len(conv.messages) if conv.messages else 0
+            message_count=conv.message_count
         )
         for conv in conversations
     ]
 
+    return ConversationPage(items=items, next_cursor=next_cursor)
+
 @router.get("/conversations/{conversation_id}", response_model=ConversationResponse)
 async def get_conversation(
     conversation_id: int,
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Get a specific conversation"""
-    
+
     tenant_id = getattr(req.state, "tenant_id", None)
     if not tenant_id:
         raise TenantNotFoundError("No tenant specified")
-    
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+
+    tenant = req.state.tenant
     if not tenant:
         raise TenantNotFoundError(tenant_id)
-    
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.tenant_id == tenant.id,
-        Conversation.user_id == current_user.id
-    ).first()
-    
+
+    result = await db.execute(
+        select(Conversation).options(
+            selectinload(Conversation.messages)
+        ).where(
+            Conversation.id == conversation_id,
+            Conversation.tenant_id == tenant.id,
+            Conversation.user_id == current_user.id
+        )
+    )
+    conversation = result.scalars().first()
+
     if not conversation:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Conversation not found"
         )
-    
+
     return ConversationResponse(
         id=conversation.id,
         title=conversation.title,
         created_at=conversation.created_at,
         updated_at=conversation.updated_at,
-        message_count=len(conversation.messages) if conversation.messages else 0,
-        messages=conversation.messages
+        message_count=conversation.message_count,
+        messages=[
+            {"role": message.role, "content": message.content}
+            for message in conversation.messages
+        ]
     )
 
+# The model catalog only changes on deploy, so compute it (and its
+# ETag) once at import and let clients/CDNs cache it
+_MODELS_PAYLOAD = ai_service.get_available_models()
+_MODELS_ETAG = hashlib.blake2b(
+    json.dumps(_MODELS_PAYLOAD, sort_keys=True).encode(),
+    digest_size=8
+).hexdigest()
+
 @router.get("/models")
-async def get_available_models():
+async def get_available_models(req: Request):
     """Get available AI models"""
-    return ai_service.get_available_models()
+    if req.headers.get("if-none-match") == _MODELS_ETAG:
+        return Response(status_code=304)
+    return JSONResponse(
+        _MODELS_PAYLOAD,
+        headers={
+            "ETag": _MODELS_ETAG,
+            "Cache-Control": "public, max-age=300"
+        }
+    )
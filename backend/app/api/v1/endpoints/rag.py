@@ -1,25 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, Request, status, UploadFile, File
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 import structlog
 
 from app.core.database import get_db
 from app.core.auth import get_current_user
 from app.schemas.rag import DocumentResponse, SearchResponse, CollectionStatsResponse
-from app.services.rag_service import RAGService
-from app.models.tenant import Tenant
+from app.services.rag_service import rag_service
 
 logger = structlog.get_logger()
 router = APIRouter()
 
-rag_service = RAGService()
-
 @router.post("/documents")
 async def upload_document(
     title: str,
     content: str,
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Upload a document to the RAG system"""
@@ -31,7 +28,7 @@ async def upload_document(
             detail="No tenant specified"
         )
     
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+    tenant = req.state.tenant
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -74,7 +71,7 @@ async def upload_document(
 async def search_documents(
     query: str,
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user),
     limit: int = 10,
     doc_type: Optional[str] = None
@@ -88,7 +85,7 @@ async def search_documents(
             detail="No tenant specified"
         )
     
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+    tenant = req.state.tenant
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -128,7 +125,7 @@ async def search_documents(
 @router.get("/stats", response_model=CollectionStatsResponse)
 async def get_collection_stats(
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Get RAG collection statistics"""
@@ -140,7 +137,7 @@ async def get_collection_stats(
             detail="No tenant specified"
         )
     
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+    tenant = req.state.tenant
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -172,7 +169,7 @@ async def get_collection_stats(
 async def delete_document(
     doc_id: str,
     req: Request,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_user)
 ):
     """Delete a document from the RAG system"""
@@ -184,7 +181,7 @@ async def delete_document(
             detail="No tenant specified"
         )
     
-    tenant = db.query(Tenant).filter(Tenant.name == tenant_id).first()
+    tenant = req.state.tenant
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
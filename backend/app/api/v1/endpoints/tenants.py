@@ -1,164 +1,207 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from pydantic import TypeAdapter
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import raiseload
 from typing import List
 import structlog
 
 from app.core.database import get_db
 from app.core.auth import get_current_admin_user
 from app.schemas.tenant import TenantCreate, TenantUpdate, TenantResponse
+from app.services.tenant_cache import invalidate_tenant
 from app.models.tenant import Tenant
 
 logger = structlog.get_logger()
 router = APIRouter()
 
+# List endpoints serialize through this adapter's Rust core in one
+# pass, skipping FastAPI's per-item jsonable_encoder loop
+_tenant_list_adapter = TypeAdapter(List[TenantResponse])
+
+def _tenant_list_response(tenants) -> Response:
+    validated = _tenant_list_adapter.validate_python(
+        tenants, from_attributes=True
+    )
+    return Response(
+        content=_tenant_list_adapter.dump_json(validated),
+        media_type="application/json"
+    )
+
 @router.get("/", response_model=List[TenantResponse])
 async def get_tenants(
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Get all tenants (admin only)"""
-    
-    tenants = db.query(Tenant).all()
-    return [
-        TenantResponse(
-            id=tenant.id,
-            name=tenant.name,
-            domain=tenant.domain,
-            display_name=tenant.display_name,
-            description=tenant.description,
-            is_active=tenant.is_active,
-            default_model=tenant.default_model,
-            max_tokens=tenant.max_tokens,
-            temperature=tenant.temperature,
-            rate_limit_per_minute=tenant.rate_limit_per_minute,
-            rate_limit_per_hour=tenant.rate_limit_per_hour,
-            created_at=tenant.created_at,
-            updated_at=tenant.updated_at
-        )
-        for tenant in tenants
-    ]
+
+    # raiseload fails fast if a serializer ever touches a lazy
+    # relationship (N+1 guard)
+    result = await db.execute(select(Tenant).options(raiseload("*")))
+    return _tenant_list_response(result.scalars().all())
 
 @router.post("/", response_model=TenantResponse)
 async def create_tenant(
     tenant_data: TenantCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Create a new tenant (admin only)"""
-    
-    # Check if tenant name already exists
-    existing_tenant = db.query(Tenant).filter(Tenant.name == tenant_data.name).first()
-    if existing_tenant:
+
+    # Check name and domain uniqueness in one roundtrip
+    result = await db.execute(
+        select(Tenant.name, Tenant.domain).where(
+            or_(
+                Tenant.name == tenant_data.name,
+                Tenant.domain == tenant_data.domain
+            )
+        ).limit(1)
+    )
+    existing = result.first()
+    if existing:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Tenant name already exists"
+            detail="Tenant name already exists" if existing.name == tenant_data.name
+            else "Domain already exists"
         )
-    
-    # Check if domain already exists
-    existing_domain = db.query(Tenant).filter(Tenant.domain == tenant_data.domain).first()
-    if existing_domain:
+
+    # Create new tenant: INSERT...RETURNING repopulates the server-side
+    # defaults (id, created_at) without a post-commit refresh SELECT
+    values = tenant_data.dict()
+    values["config"] = values["config"] or {}
+    try:
+        result = await db.execute(
+            insert(Tenant).values(**values).returning(Tenant)
+        )
+        tenant = result.scalars().one()
+        await db.commit()
+    except IntegrityError:
+        # Lost a race with a concurrent create; the unique constraints
+        # are the authority
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Domain already exists"
+            detail="Tenant name or domain already exists"
         )
-    
-    # Create new tenant
-    tenant = Tenant(
-        name=tenant_data.name,
-        domain=tenant_data.domain,
-        display_name=tenant_data.display_name,
-        description=tenant_data.description,
-        config=tenant_data.config or {},
-        is_active=tenant_data.is_active,
-        default_model=tenant_data.default_model,
-        max_tokens=tenant_data.max_tokens,
-        temperature=tenant_data.temperature,
-        rate_limit_per_minute=tenant_data.rate_limit_per_minute,
-        rate_limit_per_hour=tenant_data.rate_limit_per_hour
-    )
-    
-    db.add(tenant)
-    db.commit()
-    db.refresh(tenant)
-    
+
     logger.info(
         "Tenant created",
         tenant_id=tenant.id,
         tenant_name=tenant.name,
         created_by=current_user.id
     )
-    
-    return TenantResponse(
-        id=tenant.id,
-        name=tenant.name,
-        domain=tenant.domain,
-        display_name=tenant.display_name,
-        description=tenant.description,
-        is_active=tenant.is_active,
-        default_model=tenant.default_model,
-        max_tokens=tenant.max_tokens,
-        temperature=tenant.temperature,
-        rate_limit_per_minute=tenant.rate_limit_per_minute,
-        rate_limit_per_hour=tenant.rate_limit_per_hour,
-        created_at=tenant.created_at,
-        updated_at=tenant.updated_at
+
+    return tenant
+
+@router.post("/bulk", response_model=List[TenantResponse])
+async def create_tenants_bulk(
+    tenants_data: List[TenantCreate],
+    db: AsyncSession = Depends(get_db),
+    current_user = Depends(get_current_admin_user)
+):
+    """Create multiple tenants in one batched insert (admin only)"""
+
+    if not tenants_data:
+        return []
+
+    # One roundtrip to reject batches that collide with existing rows
+    result = await db.execute(
+        select(Tenant.name).where(
+            or_(
+                Tenant.name.in_([t.name for t in tenants_data]),
+                Tenant.domain.in_([t.domain for t in tenants_data])
+            )
+        ).limit(1)
+    )
+    if result.first():
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="One or more tenant names or domains already exist"
+        )
+
+    # Core executemany insert: one batched statement instead of a
+    # per-row add/commit cycle
+    rows = [
+        {**t.dict(), "config": t.config or {}}
+        for t in tenants_data
+    ]
+    # The execute sits inside the try too: on asyncpg, unique
+    # violations from rows racing the pre-check surface here rather
+    # than at commit
+    try:
+        result = await db.execute(insert(Tenant).returning(Tenant), rows)
+        created = result.scalars().all()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="One or more tenant names or domains already exist"
+        )
+
+    logger.info(
+        "Tenants bulk created",
+        count=len(created),
+        created_by=current_user.id
     )
 
+    return _tenant_list_response(created)
+
 @router.get("/{tenant_id}", response_model=TenantResponse)
 async def get_tenant(
     tenant_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Get a specific tenant (admin only)"""
-    
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+
+    tenant = await db.get(Tenant, tenant_id)
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tenant not found"
         )
-    
-    return TenantResponse(
-        id=tenant.id,
-        name=tenant.name,
-        domain=tenant.domain,
-        display_name=tenant.display_name,
-        description=tenant.description,
-        is_active=tenant.is_active,
-        default_model=tenant.default_model,
-        max_tokens=tenant.max_tokens,
-        temperature=tenant.temperature,
-        rate_limit_per_minute=tenant.rate_limit_per_minute,
-        rate_limit_per_hour=tenant.rate_limit_per_hour,
-        created_at=tenant.created_at,
-        updated_at=tenant.updated_at
-    )
+
+    return tenant
 
 @router.put("/{tenant_id}", response_model=TenantResponse)
 async def update_tenant(
     tenant_id: int,
     tenant_data: TenantUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Update a tenant (admin only)"""
-    
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+
+    # Single UPDATE...RETURNING: no preliminary SELECT and no per-field
+    # instrumented setattr churn
+    update_data = tenant_data.dict(exclude_unset=True)
+    if not update_data:
+        tenant = await db.get(Tenant, tenant_id)
+        if not tenant:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Tenant not found"
+            )
+        return tenant
+
+    result = await db.execute(
+        update(Tenant).where(Tenant.id == tenant_id)
+        .values(**update_data)
+        .returning(Tenant)
+    )
+    tenant = result.scalars().first()
     if not tenant:
+        await db.rollback()
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tenant not found"
         )
-    
-    # Update fields
-    update_data = tenant_data.dict(exclude_unset=True)
-    for field, value in update_data.items():
-        setattr(tenant, field, value)
-    
-    db.commit()
-    db.refresh(tenant)
-    
+
+    await db.commit()
+    await invalidate_tenant(tenant.name)
+
     logger.info(
         "Tenant updated",
         tenant_id=tenant.id,
@@ -166,47 +209,34 @@ async def update_tenant(
         updated_by=current_user.id,
         updated_fields=list(update_data.keys())
     )
-    
-    return TenantResponse(
-        id=tenant.id,
-        name=tenant.name,
-        domain=tenant.domain,
-        display_name=tenant.display_name,
-        description=tenant.description,
-        is_active=tenant.is_active,
-        default_model=tenant.default_model,
-        max_tokens=tenant.max_tokens,
-        temperature=tenant.temperature,
-        rate_limit_per_minute=tenant.rate_limit_per_minute,
-        rate_limit_per_hour=tenant.rate_limit_per_hour,
-        created_at=tenant.created_at,
-        updated_at=tenant.updated_at
-    )
+
+    return tenant
 
 @router.delete("/{tenant_id}")
 async def delete_tenant(
     tenant_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
     current_user = Depends(get_current_admin_user)
 ):
     """Delete a tenant (admin only)"""
-    
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+
+    tenant = await db.get(Tenant, tenant_id)
     if not tenant:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Tenant not found"
         )
-    
+
     # Soft delete by deactivating
     tenant.is_active = False
-    db.commit()
-    
+    await db.commit()
+    await invalidate_tenant(tenant.name)
+
     logger.info(
         "Tenant deactivated",
         tenant_id=tenant.id,
         tenant_name=tenant.name,
         deactivated_by=current_user.id
     )
-    
+
     return {"message": "Tenant deactivated successfully"}
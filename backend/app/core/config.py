@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import List, Optional
 import os
@@ -33,6 +34,10 @@ class Settings(BaseSettings):
     
     # Rate Limiting
     RATE_LIMIT_PER_MINUTE: int = 60
+
+    # Chat response cache
+    CHAT_CACHE_ENABLED: bool = True
+    CHAT_CACHE_TTL: int = 300  # seconds
     
     # Vector Database
     CHROMA_PERSIST_DIRECTORY: str = "/tmp/chroma_db"
@@ -44,4 +49,9 @@ class Settings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
-settings = Settings()
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
+    """Build Settings once; env and .env are only parsed on first call"""
+    return Settings()
+
+settings = get_settings()
@@ -1,59 +1,92 @@
-from sqlalchemy import create_engine, MetaData
+from sqlalchemy import MetaData
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
-import redis
+import orjson
+import redis.asyncio as aioredis
 import structlog
 
 from app.core.config import settings
+from app.core.enterprise_config import enterprise_settings
 
 logger = structlog.get_logger()
 
-# SQLAlchemy setup
-engine = create_engine(
-    settings.DATABASE_URL,
-    poolclass=StaticPool,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {},
-    echo=settings.DEBUG
-)
+def _async_database_url(url: str) -> str:
+    """Rewrite a database URL to use an async driver"""
+    if url.startswith("postgresql://"):
+        return url.replace("postgresql://", "postgresql+asyncpg://", 1)
+    if url.startswith("sqlite://"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    return url
+
+# SQLAlchemy setup (async engine so DB calls don't block the event loop)
+if "sqlite" in settings.DATABASE_URL:
+    # SQLite (dev/tests): a single shared in-process connection
+    engine = create_async_engine(
+        _async_database_url(settings.DATABASE_URL),
+        poolclass=StaticPool,
+        connect_args={"check_same_thread": False},
+        json_serializer=lambda obj: orjson.dumps(obj).decode(),
+        json_deserializer=orjson.loads,
+        echo=settings.DEBUG
+    )
+else:
+    # Postgres: a sized queue pool so concurrent requests aren't
+    # serialized on a single connection
+    engine = create_async_engine(
+        _async_database_url(settings.DATABASE_URL),
+        pool_size=enterprise_settings.DATABASE_POOL_SIZE,
+        max_overflow=enterprise_settings.DATABASE_MAX_OVERFLOW,
+        pool_timeout=enterprise_settings.DATABASE_POOL_TIMEOUT,
+        pool_recycle=enterprise_settings.DATABASE_POOL_RECYCLE,
+        pool_pre_ping=True,
+        json_serializer=lambda obj: orjson.dumps(obj).decode(),
+        json_deserializer=orjson.loads,
+        echo=settings.DEBUG
+    )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = async_sessionmaker(
+    engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
 
 Base = declarative_base()
 
-# Redis setup
-redis_client = redis.from_url(
-    settings.REDIS_URL, 
-    decode_responses=True,
-    ssl_cert_reqs=None,  # Disable SSL certificate verification for ElastiCache
-    ssl_check_hostname=False
+# Redis setup (async client so calls don't block the event loop).
+# A blocking pool makes callers wait for a free connection when the
+# pool is exhausted instead of erroring out under burst load.
+redis_client = aioredis.Redis(
+    connection_pool=aioredis.BlockingConnectionPool.from_url(
+        settings.REDIS_URL,
+        decode_responses=True,
+        max_connections=enterprise_settings.REDIS_MAX_CONNECTIONS,
+        ssl_cert_reqs=None,  # Disable SSL certificate verification for ElastiCache
+        ssl_check_hostname=False
+    )
 )
 
 async def init_db():
     """Initialize database tables"""
     try:
         # Import all models to ensure they are registered
-        from app.models import tenant, user, conversation, prompt_log
-        
+        from app.models import tenant, user, conversation, chat_message, prompt_log
+
         # Create all tables
-        Base.metadata.create_all(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
         logger.info("Database tables created successfully")
-        
+
         # Test Redis connection
-        redis_client.ping()
+        await redis_client.ping()
         logger.info("Redis connection established successfully")
-        
+
     except Exception as e:
         logger.error("Failed to initialize database", error=str(e))
         raise
 
-def get_db():
+async def get_db():
     """Dependency to get database session"""
-    db = SessionLocal()
-    try:
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
 
 def get_redis():
     """Dependency to get Redis client"""
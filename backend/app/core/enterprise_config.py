@@ -1,3 +1,4 @@
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from typing import List, Optional, Dict, Any
 import os
@@ -157,4 +158,9 @@ class EnterpriseSettings(BaseSettings):
         env_file = ".env"
         case_sensitive = True
 
-enterprise_settings = EnterpriseSettings()
+@lru_cache(maxsize=1)
+def get_enterprise_settings() -> EnterpriseSettings:
+    """Build EnterpriseSettings once; env and .env are only parsed on first call"""
+    return EnterpriseSettings()
+
+enterprise_settings = get_enterprise_settings()
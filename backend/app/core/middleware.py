@@ -1,86 +1,135 @@
-from fastapi import Request, HTTPException, status
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.responses import Response
 import structlog
 import time
-import uuid
-from typing import Callable
+from functools import lru_cache
+from typing import Optional
+
+from app.core.enterprise_config import enterprise_settings
+from app.core.ids import next_request_id
+from app.services.tenant_cache import resolve_tenant
 
 logger = structlog.get_logger()
 
-class TenantMiddleware(BaseHTTPMiddleware):
-    """Middleware to extract tenant information from request"""
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Extract tenant from subdomain or header
-        tenant_id = None
-        
-        # Try to get tenant from subdomain
-        host = request.headers.get("host", "")
-        if "." in host:
-            subdomain = host.split(".")[0]
-            if subdomain != "www" and subdomain != "api":
-                tenant_id = subdomain
-        
-        # Try to get tenant from header
-        if not tenant_id:
-            tenant_id = request.headers.get("x-tenant-id")
-        
-        # Add tenant to request state
-        request.state.tenant_id = tenant_id
-        
-        response = await call_next(request)
-        return response
-
-class LoggingMiddleware(BaseHTTPMiddleware):
-    """Middleware for request/response logging"""
-    
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        # Generate request ID
-        request_id = str(uuid.uuid4())
-        request.state.request_id = request_id
-        
-        # Start time
-        start_time = time.time()
-        
+# Load-balancer probes dominate request volume; neither middleware has
+# anything useful to do for them
+_HEALTH_PATHS = ("/health", "/healthz", "/ping")
+
+@lru_cache(maxsize=enterprise_settings.MAX_TENANTS)
+def _subdomain_from_host(host: bytes) -> Optional[str]:
+    """Derive the tenant subdomain from a raw host header value.
+
+    host -> subdomain is static for a given deployment, so cache it and
+    skip the per-request decode/split."""
+    host_str = host.decode("latin-1")
+    if "." in host_str:
+        subdomain = host_str.split(".")[0]
+        if subdomain != "www" and subdomain != "api":
+            return subdomain
+    return None
+
+class TenantMiddleware:
+    """Pure ASGI middleware to extract tenant information from request.
+
+    Implemented against the raw scope rather than BaseHTTPMiddleware,
+    which buffers every response through a memory stream and spawns a
+    task per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in _HEALTH_PATHS:
+            return await self.app(scope, receive, send)
+
+        # Read headers straight off the scope (bytes, no Request object)
+        host = b""
+        header_tenant = None
+        for key, value in scope["headers"]:
+            if key == b"host":
+                host = value
+            elif key == b"x-tenant-id":
+                header_tenant = value.decode("latin-1")
+
+        # Try to get tenant from subdomain, falling back to the header
+        tenant_id = _subdomain_from_host(host) or header_tenant
+
+        # Add tenant to request state, resolving the full record once
+        # here (TTL-cached) so endpoints don't each re-query it
+        state = scope.setdefault("state", {})
+        state["tenant_id"] = tenant_id
+        state["tenant"] = await resolve_tenant(tenant_id) if tenant_id else None
+
+        await self.app(scope, receive, send)
+
+class LoggingMiddleware:
+    """Pure ASGI middleware for request/response logging"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in _HEALTH_PATHS:
+            return await self.app(scope, receive, send)
+
+        # Generate request ID (cheaper than uuid4 on this per-request path)
+        request_id = next_request_id()
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+
+        # Start time (monotonic, no float conversion)
+        start_time = time.perf_counter_ns()
+
+        user_agent = None
+        for key, value in scope["headers"]:
+            if key == b"user-agent":
+                user_agent = value.decode("latin-1")
+                break
+        client = scope.get("client")
+
         # Log request
         logger.info(
             "Request started",
             request_id=request_id,
-            method=request.method,
-            url=str(request.url),
-            client_ip=request.client.host if request.client else None,
-            user_agent=request.headers.get("user-agent"),
-            tenant_id=getattr(request.state, "tenant_id", None)
+            method=scope["method"],
+            path=scope["path"],
+            client_ip=client[0] if client else None,
+            user_agent=user_agent,
+            tenant_id=state.get("tenant_id")
         )
-        
+
+        status_holder = {"status": None}
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                status_holder["status"] = message["status"]
+                # Add request ID to response headers
+                message.setdefault("headers", []).append(
+                    (b"x-request-id", request_id.encode("latin-1"))
+                )
+            await send(message)
+
         try:
-            response = await call_next(request)
-            
+            await self.app(scope, receive, send_with_request_id)
+
             # Calculate processing time
-            process_time = time.time() - start_time
-            
+            process_time = (time.perf_counter_ns() - start_time) / 1e9
+
             # Log response
             logger.info(
                 "Request completed",
                 request_id=request_id,
-                status_code=response.status_code,
+                status_code=status_holder["status"],
                 process_time=process_time
             )
-            
-            # Add request ID to response headers
-            response.headers["X-Request-ID"] = request_id
-            
-            return response
-            
+
         except Exception as e:
-            process_time = time.time() - start_time
-            
+            process_time = (time.perf_counter_ns() - start_time) / 1e9
+
             logger.error(
                 "Request failed",
                 request_id=request_id,
                 error=str(e),
                 process_time=process_time
             )
-            
+
             raise
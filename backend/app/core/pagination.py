@@ -0,0 +1,26 @@
+import base64
+import binascii
+from datetime import datetime
+from typing import Tuple
+
+from fastapi import HTTPException, status
+
+def encode_cursor(timestamp: datetime, row_id: int) -> str:
+    """Encode a (timestamp, id) keyset position as an opaque cursor"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Decode a cursor produced by encode_cursor.
+
+    The cursor comes straight from a query parameter, so a tampered or
+    truncated value is a client error (400), not a server one."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp, _, row_id = raw.rpartition("|")
+        return datetime.fromisoformat(timestamp), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
@@ -1,4 +1,5 @@
 from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -8,6 +9,7 @@ from contextlib import asynccontextmanager
 
 from app.core.config import settings
 from app.core.database import init_db
+from app.services.prompt_log_writer import prompt_log_writer
 from app.api.v1.api import api_router
 from app.core.middleware import TenantMiddleware, LoggingMiddleware
 from app.core.exceptions import setup_exception_handlers
@@ -21,15 +23,18 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting up multitenant AI application")
     await init_db()
+    await prompt_log_writer.start()
     yield
     # Shutdown
     logger.info("Shutting down multitenant AI application")
+    await prompt_log_writer.stop()
 
 app = FastAPI(
     title="Multi-tenant AI Platform",
     description="A scalable multi-tenant AI platform with RAG capabilities",
     version="1.0.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Simple health check endpoint before middleware
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy.sql import func
+from sqlalchemy.orm import relationship
+
+from app.core.database import Base
+
+class ChatMessage(Base):
+    __tablename__ = "chat_messages"
+
+    # Composite PK doubles as the (conversation_id, seq) lookup index
+    conversation_id = Column(
+        Integer, ForeignKey("conversations.id"), primary_key=True
+    )
+    seq = Column(Integer, primary_key=True)
+
+    # Message data
+    role = Column(String(20), nullable=False)
+    content = Column(Text, nullable=False)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    # Relationships
+    conversation = relationship("Conversation", back_populates="messages")
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -14,19 +15,42 @@ class Conversation(Base):
     tenant_id = Column(Integer, ForeignKey("tenants.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     
-    # Conversation data
-    messages = Column(JSON, default=list)  # Store conversation history
-    context = Column(JSON, default=dict)   # Store additional context
+    # Conversation data (history lives in chat_messages so appends are
+    # O(1) inserts instead of JSON column rewrites)
+    message_count = Column(Integer, default=0, nullable=False)
+    # JSONB on Postgres (binary storage, GIN-indexable); plain JSON elsewhere
+    context = Column(JSON().with_variant(JSONB, "postgresql"), default=dict)
     
     # Model configuration used
     model_used = Column(String(100))
-    temperature = Column(Integer)
+    temperature = Column(Float)
     max_tokens = Column(Integer)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    # server_default so rows carry a value from insert; before this,
+    # updated_at stayed NULL until the first UPDATE, which broke keyset
+    # pagination (NULLS FIRST under DESC, and no cursor can reach them)
+    updated_at = Column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now()
+    )
     
     # Relationships
     tenant = relationship("Tenant", back_populates="conversations")
     user = relationship("User", back_populates="conversations")
+    messages = relationship(
+        "ChatMessage",
+        back_populates="conversation",
+        order_by="ChatMessage.seq",
+        cascade="all, delete-orphan"
+    )
+
+# Keyset pagination ordered by (COALESCE(updated_at, created_at), id).
+# Rows created before updated_at gained its server default carry NULL
+# there, so the listing keys on the coalesced expression and this index
+# matches it.
+Index(
+    "ix_conversations_activity_id",
+    func.coalesce(Conversation.updated_at, Conversation.created_at),
+    Conversation.id
+)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, JSON, Float, Boolean, Index, text
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -6,6 +6,27 @@ from app.core.database import Base
 
 class PromptLog(Base):
     __tablename__ = "prompt_logs"
+    __table_args__ = (
+        # Keyset pagination ordered by (created_at, id)
+        Index("ix_prompt_logs_created_at_id", "created_at", "id"),
+        # Composite indexes matching the admin log filters: equality
+        # column first, created_at last so the planner can satisfy the
+        # ORDER BY ... LIMIT without a sort
+        Index("ix_prompt_logs_tenant_created", "tenant_id", "created_at"),
+        Index("ix_prompt_logs_user_created", "user_id", "created_at"),
+        Index("ix_prompt_logs_model_created", "model_used", "created_at"),
+        # Partial indexes covering the hot usage-stats aggregates
+        Index(
+            "ix_prompt_logs_success_created",
+            "created_at",
+            postgresql_where=text("status_code = 200")
+        ),
+        Index(
+            "ix_prompt_logs_cost_created",
+            "created_at",
+            postgresql_where=text("cost_usd IS NOT NULL")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     
@@ -33,6 +54,7 @@ class PromptLog(Base):
     # Response metadata
     status_code = Column(Integer)
     error_message = Column(Text)
+    cache_hit = Column(Boolean, default=False)
     
     # Timestamps
     created_at = Column(DateTime(timezone=True), server_default=func.now())
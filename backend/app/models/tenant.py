@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, Text, JSON, Float, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 
@@ -6,6 +7,19 @@ from app.core.database import Base
 
 class Tenant(Base):
     __tablename__ = "tenants"
+    __table_args__ = (
+        # Partial indexes for the per-request "active tenant" resolve
+        Index(
+            "ix_tenants_name_active",
+            "name",
+            postgresql_where=text("is_active")
+        ),
+        Index(
+            "ix_tenants_domain_active",
+            "domain",
+            postgresql_where=text("is_active")
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String(255), unique=True, index=True, nullable=False)
@@ -13,14 +27,14 @@ class Tenant(Base):
     display_name = Column(String(255), nullable=False)
     description = Column(Text)
     
-    # Configuration
-    config = Column(JSON, default=dict)
+    # Configuration (JSONB on Postgres, plain JSON elsewhere)
+    config = Column(JSON().with_variant(JSONB, "postgresql"), default=dict)
     is_active = Column(Boolean, default=True)
     
     # AI Model Configuration
     default_model = Column(String(100), default="anthropic.claude-3-sonnet-20240229-v1:0")
     max_tokens = Column(Integer, default=4000)
-    temperature = Column(Integer, default=0.7)  # Stored as integer (0-100)
+    temperature = Column(Float, default=0.7)
     
     # Rate limiting
     rate_limit_per_minute = Column(Integer, default=60)
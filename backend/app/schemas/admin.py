@@ -19,6 +19,10 @@ class PromptLogResponse(BaseModel):
     error_message: Optional[str]
     created_at: datetime
 
+class PromptLogPage(BaseModel):
+    items: List[PromptLogResponse]
+    next_cursor: Optional[str] = None
+
 class TenantStatsResponse(BaseModel):
     tenant_id: int
     tenant_name: str
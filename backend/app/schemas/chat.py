@@ -30,3 +30,7 @@ class ConversationResponse(BaseModel):
     updated_at: datetime
     message_count: int
     messages: Optional[List[Dict[str, str]]] = None
+
+class ConversationPage(BaseModel):
+    items: List[ConversationResponse]
+    next_cursor: Optional[str] = None
@@ -0,0 +1,37 @@
+from functools import lru_cache
+
+import boto3
+from botocore.config import Config
+
+from app.core.config import settings
+from app.core.enterprise_config import enterprise_settings
+
+@lru_cache(maxsize=1)
+def get_bedrock_config() -> Config:
+    """Shared botocore config for bedrock-runtime clients.
+
+    Keep-alive avoids per-call TLS handshakes, the pool is sized to the
+    configured Bedrock concurrency, and SDK retries are disabled because
+    callers retry via tenacity."""
+    return Config(
+        tcp_keepalive=True,
+        max_pool_connections=enterprise_settings.BEDROCK_MAX_CONCURRENT_REQUESTS,
+        connect_timeout=3,
+        read_timeout=enterprise_settings.BEDROCK_REQUEST_TIMEOUT,
+        retries={"max_attempts": 0, "mode": "standard"}
+    )
+
+@lru_cache(maxsize=1)
+def get_bedrock_client(region: str):
+    """One sync bedrock-runtime client per process.
+
+    Constructing a boto3 client loads service JSON and compiles endpoint
+    rules; this keeps a single warm client shared by every service.
+    """
+    return boto3.Session().client(
+        'bedrock-runtime',
+        region_name=region,
+        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+        config=get_bedrock_config()
+    )
@@ -0,0 +1,139 @@
+import asyncio
+import os
+
+import numpy as np
+import onnxruntime
+from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+from optimum.onnxruntime.configuration import AutoQuantizationConfig
+from transformers import AutoTokenizer
+
+from app.core.config import settings
+
+_MODEL_ID = "sentence-transformers/all-MiniLM-L6-v2"
+
+# Quantization happens once; the INT8 graph lives next to the vector
+# store and is reloaded on subsequent startups, so cold starts skip
+# both the download and the re-quantization
+_QUANTIZED_DIR = os.environ.get(
+    "EMBEDDING_MODEL_DIR",
+    os.path.join(settings.CHROMA_PERSIST_DIRECTORY, "embedder-int8-onnx")
+)
+
+class OnnxEmbedder:
+    """MiniLM sentence embedder on ONNX Runtime with INT8 weights.
+
+    Dynamic quantization targets AVX-512 VNNI, where MatMulInteger runs
+    on int8 dot products — roughly 2-3x the throughput of the fp32
+    PyTorch model for the same embeddings. Output matches
+    SentenceTransformer('all-MiniLM-L6-v2'): mean-pooled, L2-normalized
+    384-dim vectors."""
+
+    def __init__(self):
+        if not os.path.isdir(_QUANTIZED_DIR):
+            model = ORTModelForFeatureExtraction.from_pretrained(
+                _MODEL_ID, export=True
+            )
+            quantizer = ORTQuantizer.from_pretrained(model)
+            quantizer.quantize(
+                save_dir=_QUANTIZED_DIR,
+                quantization_config=AutoQuantizationConfig.avx512_vnni(
+                    is_static=False, per_channel=False
+                )
+            )
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        sess_options.intra_op_num_threads = os.cpu_count()
+        # Keep initializers backed by the model file so uvicorn workers
+        # share the weight pages via mmap instead of each materializing
+        # a private copy
+        sess_options.add_session_config_entry(
+            "session.use_ort_model_bytes_for_initializers", "1"
+        )
+
+        self.tokenizer = AutoTokenizer.from_pretrained(_QUANTIZED_DIR)
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            _QUANTIZED_DIR,
+            session_options=sess_options,
+            provider="CPUExecutionProvider"
+        )
+
+    def encode(self, texts) -> np.ndarray:
+        """Embed a batch of texts into L2-normalized vectors"""
+        encoded = self.tokenizer(
+            list(texts),
+            padding=True,
+            truncation=True,
+            max_length=256,
+            return_tensors="np"
+        )
+        hidden = np.asarray(self.model(**encoded).last_hidden_state)
+
+        # Mean-pool over real tokens only, then normalize — the same
+        # pooling SentenceTransformer applies for this model
+        mask = encoded["attention_mask"][..., None].astype(hidden.dtype)
+        pooled = (hidden * mask).sum(axis=1) / np.clip(
+            mask.sum(axis=1), 1e-9, None
+        )
+        return pooled / np.clip(
+            np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None
+        )
+
+
+class EmbedBatcher:
+    """Coalesces concurrent embed calls into one forward pass.
+
+    Tokenizer setup and kernel launch overhead dominate at batch=1; a
+    short collection window turns B concurrent single-text requests
+    into a single BxSeqxHidden GEMM. Callers await a future resolved
+    when their batch completes."""
+
+    def __init__(self, embedder: OnnxEmbedder, max_batch: int = 32,
+                 max_wait_ms: float = 10.0):
+        self._embedder = embedder
+        self._max_batch = max_batch
+        self._max_wait = max_wait_ms / 1000.0
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._worker = None
+
+    async def embed(self, text: str) -> np.ndarray:
+        """Embed one text, transparently batched with concurrent calls"""
+        if self._worker is None or self._worker.done():
+            self._worker = asyncio.create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((text, future))
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self._max_wait
+            while len(batch) < self._max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                    )
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                # The forward pass runs on the default executor so the
+                # event loop stays free while ONNX Runtime works
+                embeddings = await asyncio.to_thread(
+                    self._embedder.encode, [text for text, _ in batch]
+                )
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding)
@@ -1,18 +1,35 @@
-import boto3
-import json
+import asyncio
+import orjson
 import time
-import uuid
-from typing import Dict, List, Optional, Any
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Optional, Any
 from dataclasses import dataclass
 import structlog
 
 from app.core.config import settings
-from app.services.rag_service import RAGService
+from app.core.ids import next_request_id
+from app.services._bedrock_client import get_bedrock_client
+from app.services.rag_service import rag_service
 from app.core.exceptions import AIServiceError
 
 logger = structlog.get_logger()
 
-@dataclass
+# Model families with Bedrock prompt-caching support
+_PROMPT_CACHE_MODELS = (
+    "anthropic.claude-3-5-sonnet",
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet"
+)
+# Bedrock ignores checkpoints below ~1024 tokens; don't spend cache
+# writes on short prefixes (~4 chars/token)
+_PROMPT_CACHE_MIN_CHARS = 4096
+# History trimming: input cost and latency scale with tokens, not
+# message count, so bound the context by an estimated token budget
+# (~4 chars/token) leaving the configured max_tokens for the completion
+_CHARS_PER_TOKEN = 4
+_CONTEXT_WINDOW_TOKENS = 16000
+
+@dataclass(slots=True)
 class AIResponse:
     content: str
     model_used: str
@@ -27,13 +44,8 @@ class AIService:
     """Service for interacting with AWS Bedrock AI models"""
     
     def __init__(self):
-        self.bedrock_client = boto3.client(
-            'bedrock-runtime',
-            region_name=settings.BEDROCK_REGION,
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY
-        )
-        self.rag_service = RAGService()
+        self.bedrock_client = get_bedrock_client(settings.BEDROCK_REGION)
+        self.rag_service = rag_service
         
         # Model configurations
         self.model_configs = {
@@ -76,7 +88,7 @@ class AIService:
     ) -> AIResponse:
         """Generate AI response with optional RAG enhancement"""
         
-        request_id = str(uuid.uuid4())
+        request_id = next_request_id()
         start_time = time.time()
         
         try:
@@ -87,58 +99,27 @@ class AIService:
             final_temperature = temperature if temperature is not None else model_config["temperature"]
             final_max_tokens = max_tokens if max_tokens is not None else model_config["max_tokens"]
             
-            # Enhance prompt with RAG if enabled
-            enhanced_prompt = prompt
-            if use_rag:
-                rag_context = await self.rag_service.get_relevant_context(
-                    query=prompt,
-                    tenant_id=tenant_id,
-                    limit=3
-                )
-                if rag_context:
-                    enhanced_prompt = f"""Context from knowledge base:
-{rag_context}
-
-User question: {prompt}
+            # Fetch RAG context if enabled (kept separate from the user
+            # prompt so Claude requests can cache it as a stable prefix)
+            rag_context = await self._get_rag_context(prompt, tenant_id, use_rag)
 
-Please answer the user's question using the provided context when relevant."""
-            
             # Build conversation context
-            messages = []
-            if conversation_history:
-                for msg in conversation_history[-10:]:  # Limit to last 10 messages
-                    messages.append({
-                        "role": msg.get("role", "user"),
-                        "content": msg.get("content", "")
-                    })
-            
-            # Add current prompt
-            messages.append({
-                "role": "user",
-                "content": enhanced_prompt
-            })
-            
+            messages = self._build_messages(prompt, conversation_history, final_max_tokens)
+
             # Prepare request body based on model
-            if model.startswith("anthropic"):
-                request_body = self._prepare_claude_request(
-                    messages, final_temperature, final_max_tokens
-                )
-            elif model.startswith("meta"):
-                request_body = self._prepare_llama_request(
-                    messages, final_temperature, final_max_tokens
-                )
-            else:
-                raise AIServiceError(f"Unsupported model: {model}")
+            request_body = self._prepare_request_body(
+                model, messages, final_temperature, final_max_tokens, rag_context
+            )
             
             # Call Bedrock
             response = self.bedrock_client.invoke_model(
                 modelId=model,
-                body=json.dumps(request_body),
+                body=orjson.dumps(request_body),
                 contentType='application/json'
             )
             
             # Parse response
-            response_body = json.loads(response['body'].read())
+            response_body = orjson.loads(response['body'].read())
             
             if model.startswith("anthropic"):
                 content = response_body['content'][0]['text']
@@ -151,11 +132,14 @@ Please answer the user's question using the provided context when relevant."""
             latency_ms = (time.time() - start_time) * 1000
             input_tokens = usage.get('input_tokens', 0)
             output_tokens = usage.get('output_tokens', 0)
+            cache_read_tokens = usage.get('cache_read_input_tokens', 0)
+            cache_write_tokens = usage.get('cache_creation_input_tokens', 0)
             total_tokens = input_tokens + output_tokens
-            
+
             # Calculate cost
             cost_usd = self._calculate_cost(
-                model, input_tokens, output_tokens, model_config
+                model, input_tokens, output_tokens, model_config,
+                cache_read_tokens, cache_write_tokens
             )
             
             # Store in RAG if this was a useful interaction
@@ -199,19 +183,187 @@ Please answer the user's question using the provided context when relevant."""
             )
             raise AIServiceError(f"Failed to generate response: {str(e)}")
     
-    def _prepare_claude_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
-        """Prepare request body for Claude models"""
-        return {
+    async def stream_response(
+        self,
+        prompt: str,
+        model: str,
+        tenant_id: str,
+        user_id: Optional[int] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        use_rag: bool = True,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """Stream response text chunks as Bedrock produces them"""
+
+        model_config = self.model_configs.get(model, self.model_configs["anthropic.claude-3-sonnet-20240229-v1:0"])
+        final_temperature = temperature if temperature is not None else model_config["temperature"]
+        final_max_tokens = max_tokens if max_tokens is not None else model_config["max_tokens"]
+
+        rag_context = await self._get_rag_context(prompt, tenant_id, use_rag)
+        messages = self._build_messages(prompt, conversation_history, final_max_tokens)
+        request_body = self._prepare_request_body(
+            model, messages, final_temperature, final_max_tokens, rag_context
+        )
+
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            None,
+            lambda: self.bedrock_client.invoke_model_with_response_stream(
+                modelId=model,
+                body=orjson.dumps(request_body),
+                contentType='application/json'
+            )
+        )
+
+        # The boto3 event stream is a blocking iterator, so pull each
+        # event off the event loop
+        events = iter(response['body'])
+        while True:
+            event = await loop.run_in_executor(None, next, events, None)
+            if event is None:
+                break
+            chunk = orjson.loads(event['chunk']['bytes'])
+            if model.startswith("anthropic"):
+                if chunk.get('type') == 'content_block_delta':
+                    text = chunk.get('delta', {}).get('text', '')
+                    if text:
+                        yield text
+            else:
+                text = chunk.get('generation', '')
+                if text:
+                    yield text
+
+    async def _get_rag_context(
+        self, prompt: str, tenant_id: str, use_rag: bool
+    ) -> Optional[str]:
+        """Fetch RAG context for a prompt if enabled"""
+        if not use_rag:
+            return None
+
+        return await self.rag_service.get_relevant_context(
+            query=prompt,
+            tenant_id=tenant_id,
+            limit=3
+        )
+
+    def _build_messages(
+        self, prompt: str, conversation_history: Optional[List[Dict]],
+        max_tokens: int
+    ) -> List[Dict]:
+        """Build conversation context within the model's input budget.
+
+        History is kept newest-first until the estimated token budget is
+        spent, rather than a fixed message count — ten long messages can
+        cost more than a hundred short ones."""
+        messages = [{
+            "role": "user",
+            "content": prompt
+        }]
+        if conversation_history:
+            budget = (
+                _CONTEXT_WINDOW_TOKENS - max_tokens
+                - len(prompt) // _CHARS_PER_TOKEN
+            )
+            for msg in reversed(conversation_history):
+                content = msg.get("content", "")
+                budget -= len(content) // _CHARS_PER_TOKEN + 4
+                if budget < 0:
+                    break
+                messages.append({
+                    "role": msg.get("role", "user"),
+                    "content": content
+                })
+        messages.reverse()
+        return messages
+
+    def _prepare_request_body(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        max_tokens: int,
+        rag_context: Optional[str] = None
+    ) -> Dict:
+        """Prepare request body based on model family"""
+        if model.startswith("anthropic"):
+            return self._prepare_claude_request(
+                model, messages, temperature, max_tokens, rag_context
+            )
+        if model.startswith("meta"):
+            return self._prepare_llama_request(
+                messages, temperature, max_tokens, rag_context
+            )
+        raise AIServiceError(f"Unsupported model: {model}")
+
+    @staticmethod
+    def _supports_prompt_caching(model: str) -> bool:
+        return model.startswith(_PROMPT_CACHE_MODELS)
+
+    def _prepare_claude_request(
+        self,
+        model: str,
+        messages: List[Dict],
+        temperature: float,
+        max_tokens: int,
+        rag_context: Optional[str] = None
+    ) -> Dict:
+        """Prepare request body for Claude models.
+
+        RAG context goes into the system prompt, and on caching-capable
+        models the stable prefixes (system block, penultimate user turn)
+        carry cache_control checkpoints so Bedrock can reuse them across
+        turns instead of reprocessing the full prefix each call.
+        """
+        cacheable = self._supports_prompt_caching(model)
+
+        body = {
             "anthropic_version": "bedrock-2023-05-31",
             "max_tokens": max_tokens,
             "temperature": temperature,
             "messages": messages
         }
-    
-    def _prepare_llama_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
+
+        if rag_context:
+            system_block = {
+                "type": "text",
+                "text": (
+                    "Context from knowledge base:\n"
+                    f"{rag_context}\n\n"
+                    "Answer the user's question using the provided "
+                    "context when relevant."
+                )
+            }
+            if cacheable and len(rag_context) >= _PROMPT_CACHE_MIN_CHARS:
+                system_block["cache_control"] = {"type": "ephemeral"}
+            body["system"] = [system_block]
+
+        if cacheable and len(messages) >= 3:
+            # Checkpoint the conversation prefix at the penultimate user
+            # turn; earlier turns are byte-identical across requests
+            prefix = messages[-3]
+            prefix_text = prefix["content"]
+            if isinstance(prefix_text, str) and len(prefix_text) >= _PROMPT_CACHE_MIN_CHARS:
+                prefix["content"] = [{
+                    "type": "text",
+                    "text": prefix_text,
+                    "cache_control": {"type": "ephemeral"}
+                }]
+
+        return body
+
+    def _prepare_llama_request(
+        self,
+        messages: List[Dict],
+        temperature: float,
+        max_tokens: int,
+        rag_context: Optional[str] = None
+    ) -> Dict:
         """Prepare request body for Llama models"""
         # Convert messages to prompt format for Llama
         prompt = ""
+        if rag_context:
+            prompt += f"Context from knowledge base:\n{rag_context}\n\n"
         for msg in messages:
             role = msg["role"]
             content = msg["content"]
@@ -229,11 +381,27 @@ Please answer the user's question using the provided context when relevant."""
             "top_p": 0.9
         }
     
-    def _calculate_cost(self, model: str, input_tokens: int, output_tokens: int, model_config: Dict) -> float:
-        """Calculate cost based on token usage"""
-        input_cost = (input_tokens / 1000) * model_config["cost_per_1k_input"]
+    def _calculate_cost(
+        self,
+        model: str,
+        input_tokens: int,
+        output_tokens: int,
+        model_config: Dict,
+        cache_read_tokens: int = 0,
+        cache_write_tokens: int = 0
+    ) -> float:
+        """Calculate cost based on token usage.
+
+        Prompt-cache reads bill at 10% of the input rate and cache
+        writes at 125%, per Bedrock pricing."""
+        input_rate = model_config["cost_per_1k_input"]
+        input_cost = (input_tokens / 1000) * input_rate
         output_cost = (output_tokens / 1000) * model_config["cost_per_1k_output"]
-        return round(input_cost + output_cost, 6)
+        cache_cost = (
+            (cache_read_tokens / 1000) * input_rate * 0.1
+            + (cache_write_tokens / 1000) * input_rate * 1.25
+        )
+        return round(input_cost + output_cost + cache_cost, 6)
     
     def get_available_models(self) -> List[Dict]:
         """Get list of available models with their configurations"""
@@ -246,3 +414,9 @@ Please answer the user's question using the provided context when relevant."""
             }
             for model_id, config in self.model_configs.items()
         ]
+
+@lru_cache(maxsize=1)
+def get_ai_service() -> AIService:
+    """Process-wide AIService singleton, usable directly or as a
+    FastAPI dependency"""
+    return AIService()
@@ -1,23 +1,77 @@
 import asyncio
-import boto3
-import json
 import time
-import uuid
-from typing import Dict, List, Optional, Any, Tuple
+from decimal import Decimal
+from functools import lru_cache
+from types import MappingProxyType
+from typing import AsyncIterator, Dict, List, Optional, Any, Tuple
 from dataclasses import dataclass
 import structlog
-from concurrent.futures import ThreadPoolExecutor
+import aioboto3
 import aiohttp
-from tenacity import retry, stop_after_attempt, wait_exponential
+from botocore.exceptions import ClientError
+from tenacity import (
+    AsyncRetrying,
+    retry_if_exception,
+    stop_after_attempt,
+    stop_after_delay,
+    wait_random_exponential
+)
 
+from app.core.config import settings
 from app.core.enterprise_config import enterprise_settings
+from app.core.ids import next_request_id
+from app.services._bedrock_client import get_bedrock_config
 from app.services.rag_service import RAGService
+from app.services.semantic_cache import semantic_cache
 from app.core.exceptions import AIServiceError
 from app.services.rate_limiter import EnterpriseRateLimiter
 
 logger = structlog.get_logger()
 
-@dataclass
+# Cost accounting unit: microcents (1e-8 USD). Token costs become pure
+# integer arithmetic and accumulate without float drift.
+_MICROCENTS_PER_USD = 100_000_000
+
+# History trimming: bound the context by an estimated token budget
+# (~4 chars/token) instead of a fixed message count
+_CHARS_PER_TOKEN = 4
+_CONTEXT_WINDOW_TOKENS = 16000
+
+# Cost-aware model routing: short, low-priority prompts get downgraded
+# to the cheaper sibling (Sonnet -> Haiku is ~12x cheaper per token)
+_ROUTE_MAX_PROMPT_CHARS = 512
+_ROUTE_MIN_PRIORITY = 2
+_ROUTE_DOWNGRADES = {
+    "anthropic.claude-3-sonnet-20240229-v1:0":
+        "anthropic.claude-3-haiku-20240307-v1:0",
+    "meta.llama-2-70b-chat-v1": "meta.llama-2-13b-chat-v1"
+}
+
+# Bedrock error codes worth retrying; validation and auth failures
+# never succeed on a second attempt
+_RETRYABLE_ERROR_CODES = frozenset({
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelTimeoutException",
+    "InternalServerException",
+    "ModelStreamErrorException"
+})
+
+def _is_retryable(exc: BaseException) -> bool:
+    return (
+        isinstance(exc, ClientError)
+        and exc.response.get("Error", {}).get("Code") in _RETRYABLE_ERROR_CODES
+    )
+
+def _log_retry(retry_state):
+    logger.warning(
+        "Bedrock call retrying",
+        attempt=retry_state.attempt_number,
+        sleep=retry_state.next_action.sleep,
+        error=str(retry_state.outcome.exception())
+    )
+
+@dataclass(slots=True)
 class EnterpriseAIResponse:
     content: str
     model_used: str
@@ -36,21 +90,24 @@ class EnterpriseAIService:
     """Enterprise-scale AI service with advanced features for multi-tenant platform"""
     
     def __init__(self):
-        self.bedrock_client = boto3.client(
-            'bedrock-runtime',
-            region_name=enterprise_settings.BEDROCK_REGION,
-            aws_access_key_id=enterprise_settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=enterprise_settings.AWS_SECRET_ACCESS_KEY
-        )
         self.rag_service = RAGService()
+        self.semantic_cache = semantic_cache
         self.rate_limiter = EnterpriseRateLimiter()
-        
-        # Thread pool for concurrent requests
-        self.executor = ThreadPoolExecutor(max_workers=enterprise_settings.BEDROCK_MAX_CONCURRENT_REQUESTS)
-        
-        # Request queue for load balancing
-        self.request_queue = asyncio.Queue(maxsize=1000)
-        
+
+        # Async Bedrock client: created lazily on first use so __init__
+        # stays sync, then reused for the life of the process
+        self._session = aioboto3.Session()
+        self._bedrock_client = None
+        self._client_lock = asyncio.Lock()
+
+        # Keep references to fire-and-forget tasks so they aren't
+        # garbage-collected mid-flight
+        self._background_tasks: set = set()
+
+        # In-flight coalescing: identical deterministic requests share
+        # one Bedrock call, keyed by (tenant, model, prompt)
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
         # Model configurations with enterprise features
         self.model_configs = {
             "anthropic.claude-3-sonnet-20240229-v1:0": {
@@ -59,7 +116,8 @@ class EnterpriseAIService:
                 "cost_per_1k_input": 0.003,
                 "cost_per_1k_output": 0.015,
                 "max_concurrent": 50,
-                "priority": 1
+                "priority": 1,
+                "latency_optimized": False
             },
             "anthropic.claude-3-haiku-20240307-v1:0": {
                 "max_tokens": 4000,
@@ -67,7 +125,8 @@ class EnterpriseAIService:
                 "cost_per_1k_input": 0.00025,
                 "cost_per_1k_output": 0.00125,
                 "max_concurrent": 100,
-                "priority": 2
+                "priority": 2,
+                "latency_optimized": False
             },
             "meta.llama-2-70b-chat-v1": {
                 "max_tokens": 4000,
@@ -75,7 +134,8 @@ class EnterpriseAIService:
                 "cost_per_1k_input": 0.00165,
                 "cost_per_1k_output": 0.00219,
                 "max_concurrent": 30,
-                "priority": 3
+                "priority": 3,
+                "latency_optimized": False
             },
             "meta.llama-2-13b-chat-v1": {
                 "max_tokens": 4000,
@@ -83,17 +143,64 @@ class EnterpriseAIService:
                 "cost_per_1k_input": 0.00075,
                 "cost_per_1k_output": 0.001,
                 "max_concurrent": 50,
-                "priority": 4
+                "priority": 4,
+                "latency_optimized": False
             }
         }
-        
-        # Performance metrics
+
+        # Freeze configs against accidental mutation under concurrency
+        # and precompute what get_available_models would rebuild per call
+        self.model_configs = {
+            model_id: MappingProxyType(config)
+            for model_id, config in self.model_configs.items()
+        }
+        self._default_config = self.model_configs[
+            "anthropic.claude-3-sonnet-20240229-v1:0"
+        ]
+        # Per-token integer rates in microcents, exact for every
+        # configured price (cost_per_1k * 1e8 / 1e3)
+        self._cost_rates = {
+            model_id: (
+                round(config["cost_per_1k_input"] * 100_000),
+                round(config["cost_per_1k_output"] * 100_000)
+            )
+            for model_id, config in self.model_configs.items()
+        }
+        self._default_cost_rate = self._cost_rates[
+            "anthropic.claude-3-sonnet-20240229-v1:0"
+        ]
+        self._available_models = [
+            {
+                "id": model_id,
+                "name": model_id.split(".")[-1].replace("-", " ").title(),
+                "provider": model_id.split(".")[0],
+                "config": config,
+                "max_concurrent": config["max_concurrent"],
+                "priority": config["priority"]
+            }
+            for model_id, config in self.model_configs.items()
+        ]
+
+        # Per-model admission control: a semaphore sized to each model's
+        # max_concurrent bounds in-flight Bedrock calls, and waiting on
+        # it is the request queue
+        self._model_sems = {
+            model_id: asyncio.Semaphore(config["max_concurrent"])
+            for model_id, config in self.model_configs.items()
+        }
+        self._default_sem = self._model_sems[
+            "anthropic.claude-3-sonnet-20240229-v1:0"
+        ]
+
+        # Performance metrics: plain counters plus a latency sum; the
+        # average is derived in get_metrics instead of maintained as a
+        # running mean (a divide per request, and race-prone besides)
         self.metrics = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
-            "average_latency": 0.0,
-            "total_cost": 0.0
+            "latency_sum": 0.0,
+            "total_cost_microcents": 0
         }
     
     async def generate_response(
@@ -107,66 +214,97 @@ class EnterpriseAIService:
         temperature: Optional[float] = None,
         max_tokens: Optional[int] = None,
         priority: int = 1,
-        timeout: int = 300
+        timeout: int = 300,
+        rag_context: Optional[str] = None
     ) -> EnterpriseAIResponse:
         """Generate AI response with enterprise features"""
         
-        request_id = str(uuid.uuid4())
+        request_id = next_request_id()
         start_time = time.time()
         queue_start_time = time.time()
-        
+        coalesce_key = None
+
         try:
             # Check rate limits
             if not await self.rate_limiter.check_enterprise_rate_limit(
                 tenant_id, user_id, model
             ):
                 raise AIServiceError("Rate limit exceeded")
-            
+
+            # Cost-aware routing: send cheap prompts to the cheap model
+            requested_model = model
+            model = self._route_model(prompt, model, priority)
+
             # Get model configuration
-            model_config = self.model_configs.get(model, self.model_configs["anthropic.claude-3-sonnet-20240229-v1:0"])
-            
-            # Check concurrent request limits
-            if not await self._check_concurrent_limits(model, model_config):
-                # Queue the request if at limit
-                await self.request_queue.put({
-                    "prompt": prompt,
-                    "model": model,
-                    "tenant_id": tenant_id,
-                    "user_id": user_id,
-                    "conversation_history": conversation_history,
-                    "use_rag": use_rag,
-                    "temperature": temperature,
-                    "max_tokens": max_tokens,
-                    "priority": priority,
-                    "timeout": timeout,
-                    "request_id": request_id
-                })
-                
-                # Wait for processing
-                queue_time = time.time() - queue_start_time
-                result = await self._process_queued_request(request_id, timeout)
-                result.queue_time_ms = queue_time * 1000
-                return result
-            
-            # Process request immediately
-            queue_time = time.time() - queue_start_time
-            processing_start_time = time.time()
-            
-            # Enhance prompt with RAG if enabled
-            enhanced_prompt = await self._enhance_prompt_with_rag(
-                prompt, tenant_id, use_rag
-            )
-            
-            # Build conversation context
-            messages = await self._build_conversation_context(
-                enhanced_prompt, conversation_history
-            )
-            
-            # Generate response with retry logic
-            response = await self._generate_with_retry(
-                messages, model, model_config, temperature, max_tokens, timeout
+            model_config = self._resolve_model(model)
+
+            # Semantic cache: reuse is only safe for standalone,
+            # low-temperature prompts
+            final_temperature = (
+                temperature if temperature is not None
+                else model_config["temperature"]
             )
-            
+            cacheable = not conversation_history and final_temperature <= 0.3
+            if cacheable:
+                cached_content = await self.semantic_cache.get(
+                    prompt, tenant_id, model
+                )
+                if cached_content is not None:
+                    total_time = time.time() - start_time
+                    self._update_metrics(total_time, 0, True)
+                    return EnterpriseAIResponse(
+                        content=cached_content,
+                        model_used=model,
+                        input_tokens=0,
+                        output_tokens=0,
+                        total_tokens=0,
+                        latency_ms=total_time * 1000,
+                        cost_usd=0.0,
+                        request_id=request_id,
+                        tenant_id=tenant_id,
+                        user_id=user_id,
+                        processing_time_ms=total_time * 1000,
+                        queue_time_ms=0.0
+                    )
+
+            # Coalesce identical in-flight requests: only safe when the
+            # output is deterministic (no history, temperature 0), where
+            # N concurrent callers can share one Bedrock call
+            if not conversation_history and final_temperature == 0.0:
+                coalesce_key = (tenant_id, model, prompt)
+                existing = self._inflight.get(coalesce_key)
+                if existing is not None:
+                    coalesce_key = None
+                    return await asyncio.shield(existing)
+                self._inflight[coalesce_key] = (
+                    asyncio.get_event_loop().create_future()
+                )
+
+            # Admission control: waiting on the per-model semaphore is
+            # the queue, so time spent blocked here is the queue time
+            async with self._model_sems.get(model, self._default_sem):
+                queue_time = time.time() - queue_start_time
+                processing_start_time = time.time()
+
+                # Kick off RAG retrieval and assemble the history while
+                # the vector query is in flight, then append the
+                # enhanced prompt once the context arrives
+                rag_task = asyncio.create_task(
+                    self._enhance_prompt_with_rag(
+                        prompt, tenant_id, use_rag, rag_context
+                    )
+                )
+                messages = self._build_conversation_context(
+                    conversation_history,
+                    max_tokens or model_config["max_tokens"]
+                )
+                messages.append({"role": "user", "content": await rag_task})
+
+                # Generate response with retry logic
+                response = await self._generate_with_retry(
+                    messages, model, model_config, temperature, max_tokens, timeout
+                )
+
             # Calculate metrics
             processing_time = time.time() - processing_start_time
             total_time = time.time() - start_time
@@ -175,27 +313,36 @@ class EnterpriseAIService:
             content, usage = self._parse_response(response, model)
             
             # Calculate cost
-            cost_usd = self._calculate_cost(
-                model, usage.get('input_tokens', 0), 
-                usage.get('output_tokens', 0), model_config
+            cost_microcents = self._calculate_cost_microcents(
+                model, usage.get('input_tokens', 0),
+                usage.get('output_tokens', 0)
             )
-            
+            cost_usd = cost_microcents / _MICROCENTS_PER_USD
+
             # Update metrics
-            self._update_metrics(processing_time, cost_usd, True)
-            
-            # Store interaction in RAG
+            self._update_metrics(processing_time, cost_microcents, True)
+
+            # Populate the semantic cache for future near-identical prompts
+            if cacheable:
+                await self.semantic_cache.put(prompt, tenant_id, model, content)
+
+            # Store interaction in RAG as write-behind: the caller gets
+            # the response without waiting for the vector writeback
             if use_rag and len(prompt) > 50:
-                await self.rag_service.store_interaction(
+                task = asyncio.create_task(self.rag_service.store_interaction(
                     prompt=prompt,
                     response=content,
                     tenant_id=tenant_id,
                     user_id=user_id
-                )
+                ))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
             
             logger.info(
                 "Enterprise AI response generated",
                 request_id=request_id,
                 model=model,
+                requested_model=requested_model,
                 tenant_id=tenant_id,
                 user_id=user_id,
                 input_tokens=usage.get('input_tokens', 0),
@@ -205,7 +352,7 @@ class EnterpriseAIService:
                 cost_usd=cost_usd
             )
             
-            return EnterpriseAIResponse(
+            result = EnterpriseAIResponse(
                 content=content,
                 model_used=model,
                 input_tokens=usage.get('input_tokens', 0),
@@ -219,7 +366,12 @@ class EnterpriseAIService:
                 processing_time_ms=processing_time * 1000,
                 queue_time_ms=queue_time * 1000
             )
-            
+
+            if coalesce_key is not None:
+                self._inflight[coalesce_key].set_result(result)
+
+            return result
+
         except Exception as e:
             self._update_metrics(0, 0, False)
             logger.error(
@@ -230,32 +382,156 @@ class EnterpriseAIService:
                 tenant_id=tenant_id,
                 user_id=user_id
             )
-            raise AIServiceError(f"Failed to generate response: {str(e)}")
-    
+            error = AIServiceError(f"Failed to generate response: {str(e)}")
+
+            if coalesce_key is not None:
+                fut = self._inflight.get(coalesce_key)
+                if fut is not None and not fut.done():
+                    fut.set_exception(error)
+                    # Mark retrieved so a waiterless future doesn't log
+                    # "exception was never retrieved" on GC
+                    fut.exception()
+
+            raise error
+
+        finally:
+            # The pop lives here so the in-flight entry is removed on
+            # every exit — including CancelledError (client disconnect),
+            # which bypasses the except branch. A future still unset at
+            # this point had its producer cancelled; cancel it so
+            # shielded waiters wake instead of blocking forever.
+            if coalesce_key is not None:
+                fut = self._inflight.pop(coalesce_key, None)
+                if fut is not None and not fut.done():
+                    fut.cancel()
+
+    async def generate_response_stream(
+        self,
+        prompt: str,
+        model: str,
+        tenant_id: str,
+        user_id: Optional[int] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        use_rag: bool = True,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        priority: int = 1
+    ) -> AsyncIterator[str]:
+        """Stream response text chunks as Bedrock produces them.
+
+        Perceived latency drops to roughly time-to-first-token instead
+        of full-completion latency. Usage arrives in the stream's final
+        metadata event, so metrics, cost and the RAG writeback run once
+        the stream is drained. Callers wrap this in a StreamingResponse
+        with an SSE media type."""
+
+        request_id = next_request_id()
+        start_time = time.time()
+
+        if not await self.rate_limiter.check_enterprise_rate_limit(
+            tenant_id, user_id, model
+        ):
+            raise AIServiceError("Rate limit exceeded")
+
+        requested_model = model
+        model = self._route_model(prompt, model, priority)
+        model_config = self._resolve_model(model)
+
+        async with self._model_sems.get(model, self._default_sem):
+            rag_task = asyncio.create_task(
+                self._enhance_prompt_with_rag(prompt, tenant_id, use_rag)
+            )
+            messages = self._build_conversation_context(
+                conversation_history,
+                max_tokens or model_config["max_tokens"]
+            )
+            messages.append({"role": "user", "content": await rag_task})
+
+            kwargs = self._build_converse_kwargs(
+                messages, model, model_config, temperature, max_tokens
+            )
+
+            client = await self._get_bedrock_client()
+            response = await client.converse_stream(**kwargs)
+
+            chunks: List[str] = []
+            usage: Dict = {}
+            try:
+                async for event in response["stream"]:
+                    delta = event.get("contentBlockDelta")
+                    if delta:
+                        text = delta.get("delta", {}).get("text", "")
+                        if text:
+                            chunks.append(text)
+                            yield text
+                    elif "metadata" in event:
+                        usage = event["metadata"].get("usage", {})
+            finally:
+                content = "".join(chunks)
+                processing_time = time.time() - start_time
+                cost_microcents = self._calculate_cost_microcents(
+                    model, usage.get("inputTokens", 0),
+                    usage.get("outputTokens", 0)
+                )
+                cost_usd = cost_microcents / _MICROCENTS_PER_USD
+                self._update_metrics(
+                    processing_time, cost_microcents, bool(content)
+                )
+
+                if use_rag and len(prompt) > 50 and content:
+                    task = asyncio.create_task(
+                        self.rag_service.store_interaction(
+                            prompt=prompt,
+                            response=content,
+                            tenant_id=tenant_id,
+                            user_id=user_id
+                        )
+                    )
+                    self._background_tasks.add(task)
+                    task.add_done_callback(self._background_tasks.discard)
+
+                logger.info(
+                    "Enterprise AI response streamed",
+                    request_id=request_id,
+                    model=model,
+                    requested_model=requested_model,
+                    tenant_id=tenant_id,
+                    user_id=user_id,
+                    input_tokens=usage.get("inputTokens", 0),
+                    output_tokens=usage.get("outputTokens", 0),
+                    processing_time_ms=processing_time * 1000,
+                    cost_usd=cost_usd
+                )
+
     async def _enhance_prompt_with_rag(
-        self, prompt: str, tenant_id: str, use_rag: bool
+        self, prompt: str, tenant_id: str, use_rag: bool,
+        prefetched_context: Optional[str] = None
     ) -> str:
-        """Enhance prompt with RAG context"""
+        """Enhance prompt with RAG context.
+
+        prefetched_context short-circuits retrieval for batch callers
+        that already ran a shared lookup; an empty string there means
+        retrieval ran and found nothing relevant."""
         if not use_rag:
             return prompt
-        
+
+        if prefetched_context is not None:
+            if prefetched_context:
+                return self._apply_context(prompt, prefetched_context)
+            return prompt
+
         try:
             rag_context = await self.rag_service.get_relevant_context(
                 query=prompt,
                 tenant_id=tenant_id,
                 limit=5
             )
-            
-            if rag_context:
-                return f"""Context from knowledge base:
-{rag_context}
 
-User question: {prompt}
+            if rag_context:
+                return self._apply_context(prompt, rag_context)
 
-Please answer the user's question using the provided context when relevant."""
-            
             return prompt
-            
+
         except Exception as e:
             logger.warning(
                 "RAG enhancement failed",
@@ -263,176 +539,224 @@ Please answer the user's question using the provided context when relevant."""
                 tenant_id=tenant_id
             )
             return prompt
+
+    @staticmethod
+    def _apply_context(prompt: str, rag_context: str) -> str:
+        return f"""Context from knowledge base:
+{rag_context}
+
+User question: {prompt}
+
+Please answer the user's question using the provided context when relevant."""
     
-    async def _build_conversation_context(
-        self, prompt: str, conversation_history: Optional[List[Dict]]
+    def _build_conversation_context(
+        self, conversation_history: Optional[List[Dict]], max_tokens: int
     ) -> List[Dict]:
-        """Build conversation context for the model"""
+        """Build the history portion of the conversation context.
+
+        History is bounded by an estimated token budget (~4 chars per
+        token) rather than a fixed message count, since input cost and
+        latency scale with tokens; the configured max_tokens stays
+        reserved for the completion. Pure CPU work, so it runs while the
+        RAG retrieval task is in flight; the caller appends the current
+        (enhanced) prompt."""
         messages = []
-        
+
         if conversation_history:
-            # Limit to last 20 messages for performance
-            for msg in conversation_history[-20:]:
+            budget = _CONTEXT_WINDOW_TOKENS - max_tokens
+            for msg in reversed(conversation_history):
+                content = msg.get("content", "")
+                budget -= len(content) // _CHARS_PER_TOKEN + 4
+                if budget < 0:
+                    break
                 messages.append({
                     "role": msg.get("role", "user"),
-                    "content": msg.get("content", "")
+                    "content": content
                 })
-        
-        # Add current prompt
-        messages.append({
-            "role": "user",
-            "content": prompt
-        })
-        
+            messages.reverse()
+
         return messages
     
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10)
-    )
     async def _generate_with_retry(
         self, messages: List[Dict], model: str, model_config: Dict,
         temperature: Optional[float], max_tokens: Optional[int], timeout: int
     ) -> Dict:
-        """Generate response with retry logic"""
-        
-        # Prepare request body
-        if model.startswith("anthropic"):
-            request_body = self._prepare_claude_request(
-                messages, temperature or model_config["temperature"],
-                max_tokens or model_config["max_tokens"]
-            )
-        elif model.startswith("meta"):
-            request_body = self._prepare_llama_request(
-                messages, temperature or model_config["temperature"],
-                max_tokens or model_config["max_tokens"]
-            )
-        else:
-            raise AIServiceError(f"Unsupported model: {model}")
-        
-        # Make request with timeout
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            self.executor,
-            lambda: self.bedrock_client.invoke_model(
-                modelId=model,
-                body=json.dumps(request_body),
-                contentType='application/json'
-            )
+        """Generate response via the Converse API with retry logic.
+
+        Converse takes one schema for every model family, so there is no
+        per-family body assembly, and it accepts performanceConfig for
+        models with a server-side latency-optimized mode.
+
+        Retries apply only to throttling/availability error codes, with
+        AWS-style jittered backoff, and stop once the caller's timeout
+        budget is spent; everything else surfaces immediately."""
+
+        kwargs = self._build_converse_kwargs(
+            messages, model, model_config, temperature, max_tokens
         )
-        
-        return json.loads(response['body'].read())
+
+        async for attempt in AsyncRetrying(
+            retry=retry_if_exception(_is_retryable),
+            wait=wait_random_exponential(multiplier=0.5, max=8),
+            stop=stop_after_attempt(3) | stop_after_delay(timeout),
+            before_sleep=_log_retry,
+            reraise=True
+        ):
+            with attempt:
+                client = await self._get_bedrock_client()
+                return await client.converse(**kwargs)
+
+    @staticmethod
+    def _build_converse_kwargs(
+        messages: List[Dict], model: str, model_config: Dict,
+        temperature: Optional[float], max_tokens: Optional[int]
+    ) -> Dict:
+        kwargs = {
+            "modelId": model,
+            "messages": [
+                {"role": msg["role"], "content": [{"text": msg["content"]}]}
+                for msg in messages
+            ],
+            "inferenceConfig": {
+                "maxTokens": max_tokens or model_config["max_tokens"],
+                "temperature": (
+                    temperature if temperature is not None
+                    else model_config["temperature"]
+                )
+            }
+        }
+        if model_config.get("latency_optimized"):
+            kwargs["performanceConfig"] = {"latency": "optimized"}
+        return kwargs
+
+    async def _get_bedrock_client(self):
+        """Lazily create the shared aioboto3 bedrock-runtime client.
+
+        Bedrock calls are pure I/O, so a native async client lets the
+        event loop drive them directly instead of parking a worker
+        thread per in-flight request."""
+        if self._bedrock_client is None:
+            async with self._client_lock:
+                if self._bedrock_client is None:
+                    self._bedrock_client = await self._session.client(
+                        'bedrock-runtime',
+                        region_name=enterprise_settings.BEDROCK_REGION,
+                        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                        config=get_bedrock_config()
+                    ).__aenter__()
+        return self._bedrock_client
     
-    def _parse_response(self, response_body: Dict, model: str) -> Tuple[str, Dict]:
-        """Parse response based on model type"""
-        if model.startswith("anthropic"):
-            content = response_body['content'][0]['text']
-            usage = response_body.get('usage', {})
-        else:
-            content = response_body['generation']
-            usage = response_body.get('usage', {})
+    def _parse_response(self, response: Dict, model: str) -> Tuple[str, Dict]:
+        """Parse a Converse response (uniform across model families)"""
+        content = response["output"]["message"]["content"][0]["text"]
+        usage = response.get("usage", {})
         
-        return content, usage
-    
-    def _calculate_cost(self, model: str, input_tokens: int, output_tokens: int, model_config: Dict) -> float:
-        """Calculate cost based on token usage"""
-        input_cost = (input_tokens / 1000) * model_config["cost_per_1k_input"]
-        output_cost = (output_tokens / 1000) * model_config["cost_per_1k_output"]
-        return round(input_cost + output_cost, 6)
-    
-    async def _check_concurrent_limits(self, model: str, model_config: Dict) -> bool:
-        """Check if we can process the request immediately"""
-        # This would integrate with a distributed counter (Redis)
-        # For now, return True
-        return True
+        return content, {
+            "input_tokens": usage.get("inputTokens", 0),
+            "output_tokens": usage.get("outputTokens", 0)
+        }
     
-    async def _process_queued_request(self, request_id: str, timeout: int) -> EnterpriseAIResponse:
-        """Process a queued request"""
-        # This would implement queue processing logic
-        # For now, raise an error
-        raise AIServiceError("Request queued but processing not implemented")
+    def _calculate_cost_microcents(
+        self, model: str, input_tokens: int, output_tokens: int
+    ) -> int:
+        """Token cost in integer microcents — no float math, no round"""
+        rate_in, rate_out = self._cost_rates.get(model, self._default_cost_rate)
+        return input_tokens * rate_in + output_tokens * rate_out
     
-    def _update_metrics(self, processing_time: float, cost: float, success: bool):
-        """Update performance metrics"""
+    def _update_metrics(self, processing_time: float, cost_microcents: int, success: bool):
+        """Update performance counters.
+
+        Increments only — no divisions and no read-modify-write on a
+        derived value, so interleaved asyncio tasks cannot tear the
+        average."""
         self.metrics["total_requests"] += 1
         if success:
             self.metrics["successful_requests"] += 1
         else:
             self.metrics["failed_requests"] += 1
-        
-        # Update average latency
-        total_requests = self.metrics["total_requests"]
-        current_avg = self.metrics["average_latency"]
-        self.metrics["average_latency"] = (
-            (current_avg * (total_requests - 1) + processing_time) / total_requests
-        )
-        
-        self.metrics["total_cost"] += cost
-    
-    def _prepare_claude_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
-        """Prepare request body for Claude models"""
-        return {
-            "anthropic_version": "bedrock-2023-05-31",
-            "max_tokens": max_tokens,
-            "temperature": temperature,
-            "messages": messages
-        }
-    
-    def _prepare_llama_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
-        """Prepare request body for Llama models"""
-        prompt = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "user":
-                prompt += f"Human: {content}\n\n"
-            elif role == "assistant":
-                prompt += f"Assistant: {content}\n\n"
-        
-        prompt += "Assistant:"
-        
-        return {
-            "prompt": prompt,
-            "max_gen_len": max_tokens,
-            "temperature": temperature,
-            "top_p": 0.9
-        }
-    
+        self.metrics["latency_sum"] += processing_time
+        self.metrics["total_cost_microcents"] += cost_microcents
+
     def get_metrics(self) -> Dict:
-        """Get current performance metrics"""
-        return self.metrics.copy()
+        """Get current performance metrics with the average derived lazily"""
+        metrics = self.metrics.copy()
+        successful = metrics["successful_requests"]
+        metrics["average_latency"] = (
+            metrics["latency_sum"] / successful if successful else 0.0
+        )
+        metrics["total_cost"] = float(
+            Decimal(metrics.pop("total_cost_microcents"))
+            / _MICROCENTS_PER_USD
+        )
+        return metrics
     
+    @staticmethod
+    def _route_model(prompt: str, requested_model: str, priority: int) -> str:
+        """Pick the model to actually invoke.
+
+        Short prompts at priority >= 2 get the cheaper sibling of the
+        requested model; high-priority or long prompts always get what
+        was asked for."""
+        if (
+            priority >= _ROUTE_MIN_PRIORITY
+            and len(prompt) < _ROUTE_MAX_PROMPT_CHARS
+        ):
+            return _ROUTE_DOWNGRADES.get(requested_model, requested_model)
+        return requested_model
+
+    def _resolve_model(self, model: str) -> Dict:
+        """Single-lookup model config resolution with the Sonnet default"""
+        return self.model_configs.get(model) or self._default_config
+
     def get_available_models(self) -> List[Dict]:
         """Get list of available models with enterprise configurations"""
-        return [
-            {
-                "id": model_id,
-                "name": model_id.split(".")[-1].replace("-", " ").title(),
-                "provider": model_id.split(".")[0],
-                "config": config,
-                "max_concurrent": config["max_concurrent"],
-                "priority": config["priority"]
-            }
-            for model_id, config in self.model_configs.items()
-        ]
+        return list(self._available_models)
     
     async def batch_generate(
         self, requests: List[Dict], tenant_id: str
     ) -> List[EnterpriseAIResponse]:
-        """Generate multiple responses in batch"""
+        """Generate multiple responses in batch.
+
+        RAG retrieval is shared across the batch: the distinct prompts
+        are embedded and searched in a single vector query, and repeated
+        prompts reuse the same context instead of re-querying."""
+        contexts: Dict[str, Optional[str]] = {}
+        rag_prompts = list(dict.fromkeys(
+            req["prompt"] for req in requests if req.get("use_rag", True)
+        ))
+        if rag_prompts:
+            batched = await self.rag_service.get_relevant_context_many(
+                rag_prompts, tenant_id
+            )
+            contexts = dict(zip(rag_prompts, batched))
+
         tasks = []
         for req in requests:
+            use_rag = req.get("use_rag", True)
             task = self.generate_response(
                 prompt=req["prompt"],
                 model=req.get("model", "anthropic.claude-3-haiku-20240307-v1:0"),
                 tenant_id=tenant_id,
                 user_id=req.get("user_id"),
                 conversation_history=req.get("conversation_history"),
-                use_rag=req.get("use_rag", True),
+                use_rag=use_rag,
                 temperature=req.get("temperature"),
                 max_tokens=req.get("max_tokens"),
-                priority=req.get("priority", 2)
+                priority=req.get("priority", 2),
+                # Empty string marks "retrieval ran, nothing relevant"
+                rag_context=(contexts.get(req["prompt"]) or "") if use_rag else None
             )
             tasks.append(task)
         
         return await asyncio.gather(*tasks, return_exceptions=True)
+
+@lru_cache(maxsize=1)
+def get_enterprise_ai_service() -> EnterpriseAIService:
+    """Process-wide EnterpriseAIService singleton, usable directly or
+    as a FastAPI dependency.
+
+    Constructing the service is expensive (aioboto3 session, RAG
+    service, per-model semaphores) and self.metrics only makes sense
+    accumulated in one instance."""
+    return EnterpriseAIService()
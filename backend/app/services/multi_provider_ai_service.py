@@ -1,24 +1,138 @@
 import asyncio
-import boto3
+import hashlib
+import aioboto3
+import httpx
 import openai
-import requests
-import json
+import orjson
 import time
-import uuid
-from typing import Dict, List, Optional, Any, Tuple
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+from contextlib import asynccontextmanager
 from dataclasses import dataclass
+from functools import partial
 import structlog
-from concurrent.futures import ThreadPoolExecutor
 import aiohttp
-from tenacity import retry, stop_after_attempt, wait_exponential
+from botocore.exceptions import ClientError
+from tenacity import (
+    retry,
+    retry_if_exception,
+    retry_if_exception_type,
+    stop_after_attempt,
+    wait_random,
+    wait_exponential
+)
 
+from app.core.database import get_redis
 from app.core.enterprise_config import enterprise_settings
+from app.core.ids import next_request_id
+from app.services._bedrock_client import get_bedrock_config
 from app.services.rag_service import RAGService
 from app.core.exceptions import AIServiceError
 from app.services.rate_limiter import EnterpriseRateLimiter
 
 logger = structlog.get_logger()
 
+# Deterministic responses (temperature 0) are reproducible, so repeats
+# of the same (model, messages, temperature) can be served from Redis
+_LLM_CACHE_TTL = 3600
+
+# HF inference responses carry no usage block, so token counts are
+# estimated at ~4 chars/token — constant-time, and close enough for the
+# cost metrics (same heuristic the other services use)
+_CHARS_PER_TOKEN = 4
+
+_ROLE_LABELS = {"user": "Human: ", "assistant": "Assistant: "}
+
+# Static instructions lead every prompt so the provider-side prompt
+# cache sees a byte-identical prefix across calls; per-turn content
+# must stay at the tail
+_SYSTEM_PROMPT = (
+    "You are a helpful assistant. Answer the user's question using the "
+    "provided knowledge-base context when relevant."
+)
+
+# Model families with Bedrock prompt-caching support; checkpoints below
+# ~1024 tokens are ignored, so don't spend cache writes on short
+# prefixes (~4 chars/token)
+_PROMPT_CACHE_MODELS = (
+    "anthropic.claude-3-5-sonnet",
+    "anthropic.claude-3-5-haiku",
+    "anthropic.claude-3-7-sonnet"
+)
+_PROMPT_CACHE_MIN_CHARS = 4096
+
+# Invariant request-body fields, built once instead of per call. The
+# static system block is shared by reference and must never be mutated
+# in place.
+_CLAUDE_REQUEST_SKELETON = {"anthropic_version": "bedrock-2023-05-31"}
+_LLAMA_REQUEST_SKELETON = {"top_p": 0.9}
+_STATIC_SYSTEM_BLOCK = {"type": "text", "text": _SYSTEM_PROMPT}
+
+# Transient provider failures worth retrying. Anything else fails fast
+# so the caller's error isn't delayed by pointless backoff.
+_RETRYABLE_OPENAI = (
+    openai.RateLimitError,
+    openai.APIConnectionError,
+    openai.APITimeoutError,
+    openai.InternalServerError
+)
+_RETRYABLE_BEDROCK_CODES = frozenset({
+    "ThrottlingException",
+    "ServiceUnavailableException",
+    "ModelTimeoutException",
+    "InternalServerException"
+})
+
+def _bedrock_retryable(exc: BaseException) -> bool:
+    return (
+        isinstance(exc, ClientError)
+        and exc.response.get("Error", {}).get("Code") in _RETRYABLE_BEDROCK_CODES
+    )
+
+def _log_retry(retry_state) -> None:
+    logger.warning(
+        "Provider call retrying",
+        attempt=retry_state.attempt_number,
+        wait=retry_state.next_action.sleep,
+        error=str(retry_state.outcome.exception())
+    )
+
+# Shared retry policy: 4 attempts, exponential backoff capped at 8s
+# with jitter so concurrent failures don't re-converge
+_provider_retry = dict(
+    stop=stop_after_attempt(4),
+    wait=wait_exponential(multiplier=0.5, max=8) + wait_random(0, 0.5),
+    before_sleep=_log_retry,
+    reraise=True
+)
+
+# TTL for cached per-tenant lookups. Config changes are admin-driven
+# and rare; endpoints only move on redeploys, so they keep longer.
+_TENANT_CFG_TTL = 60
+_CLUSTER_ENDPOINT_TTL = 300
+
+# Prompts shorter than this carry too little signal for a useful
+# vector search; skip the round-trip entirely
+_RAG_MIN_PROMPT_CHARS = 20
+
+# How long a request may wait for a model slot before it's turned away
+# with capacity-exceeded (429) semantics instead of queueing forever
+_MODEL_QUEUE_TIMEOUT = 30
+
+def _llm_cache_key(
+    model: str, messages: List[Dict], temperature: float,
+    rag_context: Optional[str]
+) -> str:
+    payload = orjson.dumps(
+        {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "rag_context": rag_context
+        },
+        option=orjson.OPT_SORT_KEYS
+    )
+    return f"llm:response:{hashlib.sha256(payload).hexdigest()}"
+
 @dataclass
 class MultiProviderAIResponse:
     content: str
@@ -39,17 +153,23 @@ class MultiProviderAIService:
     """Multi-provider AI service supporting AWS Bedrock, OpenAI, HuggingFace, and custom models"""
     
     def __init__(self):
-        # AWS Bedrock client
-        self.bedrock_client = boto3.client(
-            'bedrock-runtime',
-            region_name=enterprise_settings.BEDROCK_REGION,
-            aws_access_key_id=enterprise_settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=enterprise_settings.AWS_SECRET_ACCESS_KEY
-        )
+        # AWS Bedrock: async client, created lazily on first use so
+        # __init__ stays sync, then reused for the life of the process
+        self._session = aioboto3.Session()
+        self._bedrock_client = None
+        self._bedrock_client_lock = asyncio.Lock()
         
-        # OpenAI client
-        self.openai_client = openai.OpenAI(
-            api_key=enterprise_settings.OPENAI_API_KEY
+        # OpenAI client: native async, with the httpx connection cap
+        # raised well past the default 100 so concurrency isn't
+        # throttled by the transport
+        self.openai_client = openai.AsyncOpenAI(
+            api_key=enterprise_settings.OPENAI_API_KEY,
+            http_client=httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=2000,
+                    max_keepalive_connections=1500
+                )
+            )
         )
         
         # HuggingFace client
@@ -59,11 +179,21 @@ class MultiProviderAIService:
                 headers={"Authorization": f"Bearer {enterprise_settings.HUGGINGFACE_API_KEY}"}
             )
         
+        # Shared session for tenant-cluster calls: keeps TLS sessions
+        # and keep-alive connections warm instead of paying the
+        # handshake on every request
+        self._custom_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=512,
+                limit_per_host=128,
+                keepalive_timeout=75,
+                ttl_dns_cache=300
+            )
+        )
+
         self.rag_service = RAGService()
         self.rate_limiter = EnterpriseRateLimiter()
-        
-        # Thread pool for concurrent requests
-        self.executor = ThreadPoolExecutor(max_workers=enterprise_settings.BEDROCK_MAX_CONCURRENT_REQUESTS)
+        self.redis_client = get_redis()
         
         # Model configurations for different providers
         self.model_configs = {
@@ -157,14 +287,59 @@ class MultiProviderAIService:
             }
         }
         
-        # Performance metrics
+        # Provider dispatch table: one dict lookup per request instead
+        # of re-running an if/elif ladder on every call. All handlers
+        # share the same signature so dispatch stays a single await.
+        self._provider_dispatch = {
+            "bedrock": self._generate_bedrock_response,
+            "openai": self._generate_openai_response,
+            "huggingface": self._generate_huggingface_response,
+            "custom": self._generate_custom_response
+        }
+
+        # Resolve each Bedrock model's body builder once at startup so
+        # the hot path never re-tests model-ID prefixes
+        for model_id, config in self.model_configs.items():
+            if config["provider"] == "bedrock":
+                if model_id.startswith("anthropic"):
+                    config["request_builder"] = partial(
+                        self._prepare_claude_request, model_id
+                    )
+                elif model_id.startswith("meta"):
+                    config["request_builder"] = self._prepare_llama_request
+
+        # Keep strong references to fire-and-forget tasks so the
+        # event loop doesn't garbage-collect them mid-flight
+        self._background_tasks: set = set()
+
+        # TTL caches for per-tenant lookups: {tenant_id: (monotonic_ts, value)}.
+        # These back every request, so they must not hit the DB each call.
+        self._tenant_cfg_cache: Dict[str, Tuple[float, Dict]] = {}
+        self._tenant_cfg_lock = asyncio.Lock()
+        self._cluster_endpoint_cache: Dict[str, Tuple[float, str]] = {}
+        self._cluster_endpoint_lock = asyncio.Lock()
+
+        # Per-model admission control: bound concurrent provider calls
+        # to each model's max_concurrent without any thread pool
+        self._model_sems = {
+            model_id: asyncio.Semaphore(config["max_concurrent"])
+            for model_id, config in self.model_configs.items()
+        }
+
+        # Performance metrics: counters plus a latency sum. The
+        # average is derived on read in get_metrics — a running mean
+        # drifts numerically over millions of samples and costs a
+        # divide per request. Plain += is safe here: coroutines only
+        # yield at awaits, and _update_metrics contains none.
         self.metrics = {
             "total_requests": 0,
             "successful_requests": 0,
             "failed_requests": 0,
-            "average_latency": 0.0,
+            "latency_sum": 0.0,
             "total_cost": 0.0,
-            "provider_usage": {}
+            "provider_usage": {},
+            "cache_hits": 0,
+            "cache_misses": 0
         }
     
     async def generate_response(
@@ -182,7 +357,7 @@ class MultiProviderAIService:
     ) -> MultiProviderAIResponse:
         """Generate AI response using the specified model and provider"""
         
-        request_id = str(uuid.uuid4())
+        request_id = next_request_id()
         start_time = time.time()
         queue_start_time = time.time()
         
@@ -202,37 +377,62 @@ class MultiProviderAIService:
             if not await self._check_tenant_model_access(tenant_id, model, model_config):
                 raise AIServiceError(f"Model {model} not available for tenant {tenant_id}")
             
-            # Enhance prompt with RAG if enabled
-            enhanced_prompt = await self._enhance_prompt_with_rag(
-                prompt, tenant_id, use_rag
-            )
-            
+            # Fetch RAG context separately from the user prompt: the
+            # static prefix stays byte-identical across calls so
+            # provider-side prompt caching can engage
+            rag_context = await self._get_rag_context(prompt, tenant_id, use_rag)
+
             # Build conversation context
-            messages = await self._build_conversation_context(
-                enhanced_prompt, conversation_history
+            messages = self._build_conversation_context(
+                prompt, conversation_history
             )
-            
-            # Generate response based on provider
-            processing_start_time = time.time()
-            
-            if model_config["provider"] == "bedrock":
-                response = await self._generate_bedrock_response(
-                    messages, model, model_config, temperature, max_tokens, timeout
-                )
-            elif model_config["provider"] == "openai":
-                response = await self._generate_openai_response(
-                    messages, model, model_config, temperature, max_tokens, timeout
-                )
-            elif model_config["provider"] == "huggingface":
-                response = await self._generate_huggingface_response(
-                    messages, model, model_config, temperature, max_tokens, timeout
-                )
-            elif model_config["provider"] == "custom":
-                response = await self._generate_custom_response(
-                    messages, model, model_config, tenant_id, temperature, max_tokens, timeout
+
+            # Deterministic calls are cache-safe: identical
+            # (model, messages, temperature) produces identical output
+            final_temperature = (
+                temperature if temperature is not None
+                else model_config["temperature"]
+            )
+            cache_key = None
+            if final_temperature == 0.0:
+                cache_key = _llm_cache_key(
+                    model, messages, final_temperature, rag_context
                 )
-            else:
+                cached = await self.redis_client.get(cache_key)
+                if cached is not None:
+                    self.metrics["cache_hits"] += 1
+                    entry = orjson.loads(cached)
+                    total_time = time.time() - start_time
+                    return MultiProviderAIResponse(
+                        content=entry["content"],
+                        provider=model_config["provider"],
+                        model_used=model,
+                        input_tokens=entry["usage"].get("input_tokens", 0),
+                        output_tokens=entry["usage"].get("output_tokens", 0),
+                        total_tokens=entry["usage"].get("total_tokens", 0),
+                        latency_ms=total_time * 1000,
+                        cost_usd=0.0,
+                        request_id=request_id,
+                        tenant_id=tenant_id,
+                        user_id=user_id,
+                        processing_time_ms=0.0,
+                        queue_time_ms=0.0
+                    )
+                self.metrics["cache_misses"] += 1
+
+            # Generate response via the precomputed dispatch table,
+            # under the model's concurrency cap
+            processing_start_time = time.time()
+
+            handler = self._provider_dispatch.get(model_config["provider"])
+            if handler is None:
                 raise AIServiceError(f"Unsupported provider: {model_config['provider']}")
+
+            async with self._model_slot(model):
+                response = await handler(
+                    messages, model, model_config, tenant_id, temperature,
+                    max_tokens, timeout, rag_context
+                )
             
             # Calculate metrics
             processing_time = time.time() - processing_start_time
@@ -250,15 +450,26 @@ class MultiProviderAIService:
             
             # Update metrics
             self._update_metrics(processing_time, cost_usd, True, model_config["provider"])
+
+            # Populate the deterministic-response cache
+            if cache_key is not None:
+                await self.redis_client.setex(
+                    cache_key,
+                    _LLM_CACHE_TTL,
+                    orjson.dumps({"content": content, "usage": usage})
+                )
             
-            # Store interaction in RAG (tenant-specific)
+            # Store interaction in RAG (tenant-specific) off the
+            # critical path; the response doesn't wait on the write
             if use_rag and len(prompt) > 50:
-                await self.rag_service.store_interaction(
+                task = asyncio.create_task(self.rag_service.store_interaction(
                     prompt=prompt,
                     response=content,
                     tenant_id=tenant_id,
                     user_id=user_id
-                )
+                ))
+                self._background_tasks.add(task)
+                task.add_done_callback(self._background_tasks.discard)
             
             logger.info(
                 "Multi-provider AI response generated",
@@ -302,64 +513,350 @@ class MultiProviderAIService:
             )
             raise AIServiceError(f"Failed to generate response: {str(e)}")
     
+    @asynccontextmanager
+    async def _model_slot(self, model: str):
+        """Acquire the model's concurrency slot, or turn the request
+        away after _MODEL_QUEUE_TIMEOUT so a spike fails fast with 429
+        semantics instead of queueing unboundedly"""
+        sem = self._model_sems[model]
+        try:
+            await asyncio.wait_for(sem.acquire(), timeout=_MODEL_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise AIServiceError(f"Model capacity exceeded: {model}")
+        try:
+            yield
+        finally:
+            sem.release()
+
+    async def generate_responses(
+        self,
+        requests: List[Dict],
+        on_progress: Optional[Callable[[int, int], None]] = None
+    ) -> List[MultiProviderAIResponse]:
+        """Generate many responses concurrently.
+
+        Every underlying call is admission-controlled by its model's
+        semaphore, so a large batch saturates — but never exceeds — the
+        per-model concurrency caps. on_progress, when given, is invoked
+        with (completed, total) as results land. Failures come back as
+        exceptions in the result list rather than aborting the batch."""
+        total = len(requests)
+        completed = 0
+
+        async def run(req: Dict):
+            nonlocal completed
+            try:
+                return await self.generate_response(**req)
+            finally:
+                completed += 1
+                if on_progress is not None:
+                    on_progress(completed, total)
+
+        return await asyncio.gather(
+            *(run(req) for req in requests), return_exceptions=True
+        )
+
+    async def generate_response_stream(
+        self,
+        prompt: str,
+        model: str,
+        tenant_id: str,
+        user_id: Optional[int] = None,
+        conversation_history: Optional[List[Dict]] = None,
+        use_rag: bool = True,
+        temperature: Optional[float] = None,
+        max_tokens: Optional[int] = None,
+        timeout: int = 300
+    ) -> AsyncIterator[str]:
+        """Stream a response chunk-by-chunk as the provider emits it.
+
+        Time-to-first-token stops being bound by the full completion
+        and the body never sits in memory whole. Bedrock and OpenAI
+        expose streaming APIs; other providers raise."""
+        request_id = next_request_id()
+        start_time = time.time()
+
+        if not await self.rate_limiter.check_enterprise_rate_limit(
+            tenant_id, user_id, model
+        ):
+            raise AIServiceError("Rate limit exceeded")
+
+        model_config = self.model_configs.get(model)
+        if not model_config:
+            raise AIServiceError(f"Unsupported model: {model}")
+        provider = model_config["provider"]
+        if provider not in ("bedrock", "openai"):
+            raise AIServiceError(f"Streaming not supported for provider: {provider}")
+
+        if not await self._check_tenant_model_access(tenant_id, model, model_config):
+            raise AIServiceError(f"Model {model} not available for tenant {tenant_id}")
+
+        rag_context = await self._get_rag_context(prompt, tenant_id, use_rag)
+        messages = self._build_conversation_context(prompt, conversation_history)
+        final_temperature = (
+            temperature if temperature is not None
+            else model_config["temperature"]
+        )
+        final_max_tokens = max_tokens or model_config["max_tokens"]
+
+        # The provider generators fill this in from stream metadata so
+        # cost can be accounted after the last chunk
+        usage: Dict[str, int] = {}
+        try:
+            if provider == "bedrock":
+                chunks = self._stream_bedrock_chunks(
+                    model, model_config, messages, final_temperature,
+                    final_max_tokens, rag_context, usage
+                )
+            else:
+                chunks = self._stream_openai_chunks(
+                    model, messages, final_temperature, final_max_tokens,
+                    timeout, rag_context, usage
+                )
+
+            async with self._model_slot(model):
+                async for text in chunks:
+                    yield text
+        except Exception as e:
+            self._update_metrics(0, 0, False, provider)
+            logger.error(
+                "Multi-provider AI stream error",
+                request_id=request_id,
+                error=str(e),
+                model=model,
+                tenant_id=tenant_id,
+                user_id=user_id
+            )
+            raise AIServiceError(f"Failed to stream response: {str(e)}")
+
+        processing_time = time.time() - start_time
+        cost_usd = self._calculate_cost(
+            model, usage.get("input_tokens", 0),
+            usage.get("output_tokens", 0), model_config
+        )
+        self._update_metrics(processing_time, cost_usd, True, provider)
+
+        logger.info(
+            "Multi-provider AI response streamed",
+            request_id=request_id,
+            provider=provider,
+            model=model,
+            tenant_id=tenant_id,
+            user_id=user_id,
+            input_tokens=usage.get("input_tokens", 0),
+            output_tokens=usage.get("output_tokens", 0),
+            processing_time_ms=processing_time * 1000,
+            cost_usd=cost_usd
+        )
+
+    async def _stream_bedrock_chunks(
+        self, model: str, model_config: Dict, messages: List[Dict],
+        temperature: float, max_tokens: int, rag_context: Optional[str],
+        usage: Dict[str, int]
+    ) -> AsyncIterator[str]:
+        """Yield text deltas from invoke_model_with_response_stream"""
+        builder = model_config.get("request_builder")
+        if builder is None:
+            raise AIServiceError(f"Unsupported Bedrock model: {model}")
+        request_body = builder(messages, temperature, max_tokens, rag_context)
+
+        client = await self._get_bedrock_client()
+        response = await client.invoke_model_with_response_stream(
+            modelId=model,
+            body=orjson.dumps(request_body),
+            contentType='application/json'
+        )
+
+        async for event in response['body']:
+            chunk = orjson.loads(event['chunk']['bytes'])
+            chunk_type = chunk.get("type")
+            if chunk_type == "content_block_delta":
+                text = chunk["delta"].get("text")
+                if text:
+                    yield text
+            elif chunk_type == "message_start":
+                usage["input_tokens"] = (
+                    chunk["message"].get("usage", {}).get("input_tokens", 0)
+                )
+            elif chunk_type == "message_delta":
+                usage["output_tokens"] = (
+                    chunk.get("usage", {}).get("output_tokens", 0)
+                )
+
+    async def _stream_openai_chunks(
+        self, model: str, messages: List[Dict], temperature: float,
+        max_tokens: int, timeout: int, rag_context: Optional[str],
+        usage: Dict[str, int]
+    ) -> AsyncIterator[str]:
+        """Yield content deltas from a streaming chat completion"""
+        stream = await self.openai_client.chat.completions.create(
+            model=model,
+            messages=self._build_openai_messages(messages, rag_context),
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            stream=True,
+            stream_options={"include_usage": True}
+        )
+
+        async for event in stream:
+            if event.usage is not None:
+                usage["input_tokens"] = event.usage.prompt_tokens
+                usage["output_tokens"] = event.usage.completion_tokens
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
+
+    async def submit_batch(self, requests: List[Dict], model: str) -> str:
+        """Submit a bulk job through the OpenAI Batch API.
+
+        Batch jobs are billed at half the synchronous per-token rate and
+        run outside the sync rate limits, so evals and backfills should
+        go through here instead of N generate_response calls. Each
+        request dict needs a custom_id and a messages list. Returns the
+        batch ID for later polling."""
+        model_config = self.model_configs.get(model)
+        if not model_config:
+            raise AIServiceError(f"Unsupported model: {model}")
+        if model_config["provider"] != "openai":
+            # Bedrock exposes batch inference through model-invocation
+            # jobs rather than a Batch API; we only route OpenAI models
+            # here until that path is wired up.
+            raise AIServiceError(
+                f"Batch submission is not supported for provider: {model_config['provider']}"
+            )
+
+        lines = []
+        for request in requests:
+            lines.append(orjson.dumps({
+                "custom_id": request["custom_id"],
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": request["messages"],
+                    "max_tokens": request.get("max_tokens", model_config["max_tokens"]),
+                    "temperature": request.get("temperature", model_config["temperature"])
+                }
+            }))
+
+        input_file = await self.openai_client.files.create(
+            file=("batch.jsonl", b"\n".join(lines)),
+            purpose="batch"
+        )
+        batch = await self.openai_client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+
+        logger.info(
+            "Batch submitted",
+            batch_id=batch.id,
+            model=model,
+            request_count=len(requests)
+        )
+
+        return batch.id
+
+    async def poll_batch(self, batch_id: str, poll_interval: int = 60) -> List[Dict]:
+        """Wait for a submitted batch to finish and return its results.
+
+        Polls at poll_interval seconds until the batch reaches a
+        terminal state, then downloads and parses the JSONL output."""
+        while True:
+            batch = await self.openai_client.batches.retrieve(batch_id)
+            if batch.status == "completed":
+                break
+            if batch.status in ("failed", "expired", "cancelled"):
+                raise AIServiceError(f"Batch {batch_id} ended with status: {batch.status}")
+            await asyncio.sleep(poll_interval)
+
+        output = await self.openai_client.files.content(batch.output_file_id)
+        return [orjson.loads(line) for line in output.text.splitlines() if line]
+
+    @retry(retry=retry_if_exception(_bedrock_retryable), **_provider_retry)
     async def _generate_bedrock_response(
         self, messages: List[Dict], model: str, model_config: Dict,
-        temperature: Optional[float], max_tokens: Optional[int], timeout: int
+        tenant_id: str, temperature: Optional[float],
+        max_tokens: Optional[int], timeout: int,
+        rag_context: Optional[str] = None
     ) -> Dict:
         """Generate response using AWS Bedrock"""
         
-        # Prepare request body
-        if model.startswith("anthropic"):
-            request_body = self._prepare_claude_request(
-                messages, temperature or model_config["temperature"],
-                max_tokens or model_config["max_tokens"]
-            )
-        elif model.startswith("meta"):
-            request_body = self._prepare_llama_request(
-                messages, temperature or model_config["temperature"],
-                max_tokens or model_config["max_tokens"]
-            )
-        else:
+        # Body builder was resolved per model at startup
+        builder = model_config.get("request_builder")
+        if builder is None:
             raise AIServiceError(f"Unsupported Bedrock model: {model}")
-        
-        # Make request
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            self.executor,
-            lambda: self.bedrock_client.invoke_model(
-                modelId=model,
-                body=json.dumps(request_body),
-                contentType='application/json'
-            )
+        request_body = builder(
+            messages, temperature or model_config["temperature"],
+            max_tokens or model_config["max_tokens"], rag_context
         )
         
-        return json.loads(response['body'].read())
+        # Make request on the event loop; no thread-pool hop
+        client = await self._get_bedrock_client()
+        response = await client.invoke_model(
+            modelId=model,
+            body=orjson.dumps(request_body),
+            contentType='application/json'
+        )
+
+        return orjson.loads(await response['body'].read())
+
+    async def _get_bedrock_client(self):
+        """Lazily create the shared aioboto3 bedrock-runtime client.
+
+        Bedrock calls are pure I/O; a native async client lets the event
+        loop drive them directly instead of parking an executor thread
+        per in-flight request."""
+        if self._bedrock_client is None:
+            async with self._bedrock_client_lock:
+                if self._bedrock_client is None:
+                    self._bedrock_client = await self._session.client(
+                        'bedrock-runtime',
+                        region_name=enterprise_settings.BEDROCK_REGION,
+                        aws_access_key_id=enterprise_settings.AWS_ACCESS_KEY_ID,
+                        aws_secret_access_key=enterprise_settings.AWS_SECRET_ACCESS_KEY,
+                        config=get_bedrock_config()
+                    ).__aenter__()
+        return self._bedrock_client
     
-    async def _generate_openai_response(
-        self, messages: List[Dict], model: str, model_config: Dict,
-        temperature: Optional[float], max_tokens: Optional[int], timeout: int
-    ) -> Dict:
-        """Generate response using OpenAI"""
-        
-        # Convert messages to OpenAI format
-        openai_messages = []
+    @staticmethod
+    def _build_openai_messages(
+        messages: List[Dict], rag_context: Optional[str]
+    ) -> List[Dict]:
+        """Static system prompt first (stable prefix for OpenAI's
+        prompt cache), then the per-request context, then the turns"""
+        openai_messages = [{"role": "system", "content": _SYSTEM_PROMPT}]
+        if rag_context:
+            openai_messages.append({
+                "role": "system",
+                "content": f"Context from knowledge base:\n{rag_context}"
+            })
         for msg in messages:
             openai_messages.append({
                 "role": msg["role"],
                 "content": msg["content"]
             })
+        return openai_messages
+
+    @retry(retry=retry_if_exception_type(_RETRYABLE_OPENAI), **_provider_retry)
+    async def _generate_openai_response(
+        self, messages: List[Dict], model: str, model_config: Dict,
+        tenant_id: str, temperature: Optional[float],
+        max_tokens: Optional[int], timeout: int,
+        rag_context: Optional[str] = None
+    ) -> Dict:
+        """Generate response using OpenAI"""
         
-        # Make request
-        loop = asyncio.get_event_loop()
-        response = await loop.run_in_executor(
-            self.executor,
-            lambda: self.openai_client.chat.completions.create(
-                model=model,
-                messages=openai_messages,
-                temperature=temperature or model_config["temperature"],
-                max_tokens=max_tokens or model_config["max_tokens"],
-                timeout=timeout
-            )
+        openai_messages = self._build_openai_messages(messages, rag_context)
+
+        # Make request on the event loop; no thread-pool hop
+        response = await self.openai_client.chat.completions.create(
+            model=model,
+            messages=openai_messages,
+            temperature=temperature or model_config["temperature"],
+            max_tokens=max_tokens or model_config["max_tokens"],
+            timeout=timeout
         )
         
         return {
@@ -371,9 +868,12 @@ class MultiProviderAIService:
             }
         }
     
+    @retry(retry=retry_if_exception_type(aiohttp.ClientResponseError), **_provider_retry)
     async def _generate_huggingface_response(
         self, messages: List[Dict], model: str, model_config: Dict,
-        temperature: Optional[float], max_tokens: Optional[int], timeout: int
+        tenant_id: str, temperature: Optional[float],
+        max_tokens: Optional[int], timeout: int,
+        rag_context: Optional[str] = None
     ) -> Dict:
         """Generate response using HuggingFace"""
         
@@ -381,7 +881,7 @@ class MultiProviderAIService:
             raise AIServiceError("HuggingFace client not configured")
         
         # Prepare request
-        prompt = self._messages_to_prompt(messages)
+        prompt = self._messages_to_prompt(messages, rag_context)
         
         payload = {
             "inputs": prompt,
@@ -398,23 +898,31 @@ class MultiProviderAIService:
             json=payload,
             timeout=timeout
         ) as response:
+            if response.status == 429 or response.status >= 500:
+                # Transient: surface as ClientResponseError so the
+                # retry policy picks it up
+                response.raise_for_status()
             if response.status != 200:
                 raise AIServiceError(f"HuggingFace API error: {response.status}")
             
             result = await response.json()
-            
+
+            input_tokens = len(prompt) // _CHARS_PER_TOKEN
+            output_tokens = len(result[0]["generated_text"]) // _CHARS_PER_TOKEN
             return {
                 "content": result[0]["generated_text"],
                 "usage": {
-                    "input_tokens": len(prompt.split()),
-                    "output_tokens": len(result[0]["generated_text"].split()),
-                    "total_tokens": len(prompt.split()) + len(result[0]["generated_text"].split())
+                    "input_tokens": input_tokens,
+                    "output_tokens": output_tokens,
+                    "total_tokens": input_tokens + output_tokens
                 }
             }
     
+    @retry(retry=retry_if_exception_type(aiohttp.ClientResponseError), **_provider_retry)
     async def _generate_custom_response(
         self, messages: List[Dict], model: str, model_config: Dict,
-        tenant_id: str, temperature: Optional[float], max_tokens: Optional[int], timeout: int
+        tenant_id: str, temperature: Optional[float], max_tokens: Optional[int],
+        timeout: int, rag_context: Optional[str] = None
     ) -> Dict:
         """Generate response using custom model deployed on tenant cluster"""
         
@@ -422,7 +930,7 @@ class MultiProviderAIService:
         cluster_endpoint = await self._get_tenant_cluster_endpoint(tenant_id)
         
         # Prepare request
-        prompt = self._messages_to_prompt(messages)
+        prompt = self._messages_to_prompt(messages, rag_context)
         
         payload = {
             "prompt": prompt,
@@ -431,27 +939,70 @@ class MultiProviderAIService:
             "model": model
         }
         
-        # Make request to tenant cluster
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{cluster_endpoint}/api/v1/inference",
-                json=payload,
-                timeout=timeout
-            ) as response:
-                if response.status != 200:
-                    raise AIServiceError(f"Custom model API error: {response.status}")
-                
-                result = await response.json()
-                
-                return {
-                    "content": result["response"],
-                    "usage": {
-                        "input_tokens": result.get("input_tokens", 0),
-                        "output_tokens": result.get("output_tokens", 0),
-                        "total_tokens": result.get("total_tokens", 0)
-                    }
+        # Make request to tenant cluster over the shared session
+        async with self._custom_session.post(
+            f"{cluster_endpoint}/api/v1/inference",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=timeout)
+        ) as response:
+            if response.status == 429 or response.status >= 500:
+                response.raise_for_status()
+            if response.status != 200:
+                raise AIServiceError(f"Custom model API error: {response.status}")
+
+            result = await response.json()
+
+            return {
+                "content": result["response"],
+                "usage": {
+                    "input_tokens": result.get("input_tokens", 0),
+                    "output_tokens": result.get("output_tokens", 0),
+                    "total_tokens": result.get("total_tokens", 0)
                 }
+            }
     
+    async def _get_rag_context(
+        self, prompt: str, tenant_id: str, use_rag: bool
+    ) -> Optional[str]:
+        """Fetch RAG context for a prompt if enabled and worthwhile"""
+        if not use_rag or len(prompt) < _RAG_MIN_PROMPT_CHARS:
+            return None
+
+        try:
+            return await self.rag_service.get_relevant_context(
+                query=prompt,
+                tenant_id=tenant_id,
+                limit=5
+            )
+        except Exception as e:
+            logger.warning(
+                "RAG retrieval failed",
+                error=str(e),
+                tenant_id=tenant_id
+            )
+            return None
+
+    def _build_conversation_context(
+        self, prompt: str, conversation_history: Optional[List[Dict]]
+    ) -> List[Dict]:
+        """Build conversation context for the model"""
+        messages = []
+
+        if conversation_history:
+            # Limit to last 20 messages for performance
+            for msg in conversation_history[-20:]:
+                messages.append({
+                    "role": msg.get("role", "user"),
+                    "content": msg.get("content", "")
+                })
+
+        messages.append({
+            "role": "user",
+            "content": prompt
+        })
+
+        return messages
+
     async def _check_tenant_model_access(self, tenant_id: str, model: str, model_config: Dict) -> bool:
         """Check if tenant has access to the specified model"""
         
@@ -472,7 +1023,26 @@ class MultiProviderAIService:
         return True
     
     async def _get_tenant_config(self, tenant_id: str) -> Dict:
-        """Get tenant configuration from database"""
+        """Get tenant configuration, cached for _TENANT_CFG_TTL seconds.
+
+        Every generate_response call needs this, so the backing fetch
+        runs once per (tenant, TTL window) instead of once per request.
+        The lock keeps a cold tenant from fanning out into a stampede of
+        concurrent fetches."""
+        cached = self._tenant_cfg_cache.get(tenant_id)
+        if cached and time.monotonic() - cached[0] < _TENANT_CFG_TTL:
+            return cached[1]
+
+        async with self._tenant_cfg_lock:
+            cached = self._tenant_cfg_cache.get(tenant_id)
+            if cached and time.monotonic() - cached[0] < _TENANT_CFG_TTL:
+                return cached[1]
+            config = await self._fetch_tenant_config(tenant_id)
+            self._tenant_cfg_cache[tenant_id] = (time.monotonic(), config)
+            return config
+
+    async def _fetch_tenant_config(self, tenant_id: str) -> Dict:
+        """Fetch tenant configuration from the database"""
         # This would query the database for tenant configuration
         # For now, return a default configuration
         return {
@@ -481,26 +1051,50 @@ class MultiProviderAIService:
             "custom_models": [],
             "data_isolation": "strict"
         }
-    
+
     async def _get_tenant_cluster_endpoint(self, tenant_id: str) -> str:
-        """Get the endpoint for tenant's dedicated cluster"""
+        """Get the tenant's cluster endpoint, cached for _CLUSTER_ENDPOINT_TTL seconds"""
+        cached = self._cluster_endpoint_cache.get(tenant_id)
+        if cached and time.monotonic() - cached[0] < _CLUSTER_ENDPOINT_TTL:
+            return cached[1]
+
+        async with self._cluster_endpoint_lock:
+            cached = self._cluster_endpoint_cache.get(tenant_id)
+            if cached and time.monotonic() - cached[0] < _CLUSTER_ENDPOINT_TTL:
+                return cached[1]
+            endpoint = await self._fetch_tenant_cluster_endpoint(tenant_id)
+            self._cluster_endpoint_cache[tenant_id] = (time.monotonic(), endpoint)
+            return endpoint
+
+    async def _fetch_tenant_cluster_endpoint(self, tenant_id: str) -> str:
+        """Fetch the endpoint for tenant's dedicated cluster"""
         # This would query the database or service discovery for tenant cluster endpoint
         # For now, return a placeholder
         return f"https://tenant-{tenant_id}-cluster.internal"
+
+    def invalidate_tenant(self, tenant_id: str) -> None:
+        """Drop cached lookups for a tenant after an admin update"""
+        self._tenant_cfg_cache.pop(tenant_id, None)
+        self._cluster_endpoint_cache.pop(tenant_id, None)
     
-    def _messages_to_prompt(self, messages: List[Dict]) -> str:
-        """Convert messages to a single prompt string"""
-        prompt = ""
+    def _messages_to_prompt(
+        self, messages: List[Dict], rag_context: Optional[str] = None
+    ) -> str:
+        """Convert messages to a single prompt string.
+
+        Static instructions first, context second, turns last — the
+        same prefix ordering the chat-format providers use."""
+        # Accumulate parts and join once: repeated += on an immutable
+        # str goes quadratic on long histories
+        parts = [_SYSTEM_PROMPT, "\n\n"]
+        if rag_context:
+            parts += ("Context from knowledge base:\n", rag_context, "\n\n")
         for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "user":
-                prompt += f"Human: {content}\n\n"
-            elif role == "assistant":
-                prompt += f"Assistant: {content}\n\n"
-        
-        prompt += "Assistant:"
-        return prompt
+            label = _ROLE_LABELS.get(msg["role"])
+            if label:
+                parts += (label, msg["content"], "\n\n")
+        parts.append("Assistant:")
+        return "".join(parts)
     
     def _parse_response(self, response_body: Dict, provider: str) -> Tuple[str, Dict]:
         """Parse response based on provider"""
@@ -536,61 +1130,96 @@ class MultiProviderAIService:
         else:
             self.metrics["failed_requests"] += 1
         
-        # Update average latency
-        total_requests = self.metrics["total_requests"]
-        current_avg = self.metrics["average_latency"]
-        self.metrics["average_latency"] = (
-            (current_avg * (total_requests - 1) + processing_time) / total_requests
-        )
-        
+        self.metrics["latency_sum"] += processing_time
         self.metrics["total_cost"] += cost
-        
+
         # Update provider usage
-        if provider not in self.metrics["provider_usage"]:
-            self.metrics["provider_usage"][provider] = 0
-        self.metrics["provider_usage"][provider] += 1
+        usage = self.metrics["provider_usage"]
+        usage[provider] = usage.get(provider, 0) + 1
     
-    def _prepare_claude_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
-        """Prepare request body for Claude models"""
+    def _prepare_claude_request(
+        self, model: str, messages: List[Dict], temperature: float,
+        max_tokens: int, rag_context: Optional[str] = None
+    ) -> Dict:
+        """Prepare request body for Claude models.
+
+        The static system prompt leads, RAG context follows, the
+        conversational turns come last; providers only reuse cached
+        prefixes that are byte-identical, so per-turn content must stay
+        at the tail. On caching-capable models the stable prefix gets a
+        cache_control checkpoint."""
+        system = [_STATIC_SYSTEM_BLOCK]
+        if rag_context:
+            # The cache checkpoint only ever lands on this appended
+            # block, so the shared static block is never mutated
+            context_block = {
+                "type": "text",
+                "text": f"Context from knowledge base:\n{rag_context}"
+            }
+            if (
+                model.startswith(_PROMPT_CACHE_MODELS)
+                and len(rag_context) >= _PROMPT_CACHE_MIN_CHARS
+            ):
+                context_block["cache_control"] = {"type": "ephemeral"}
+            system.append(context_block)
+
         return {
-            "anthropic_version": "bedrock-2023-05-31",
+            **_CLAUDE_REQUEST_SKELETON,
             "max_tokens": max_tokens,
             "temperature": temperature,
+            "system": system,
             "messages": messages
         }
     
-    def _prepare_llama_request(self, messages: List[Dict], temperature: float, max_tokens: int) -> Dict:
+    def _prepare_llama_request(
+        self, messages: List[Dict], temperature: float, max_tokens: int,
+        rag_context: Optional[str] = None
+    ) -> Dict:
         """Prepare request body for Llama models"""
-        prompt = self._messages_to_prompt(messages)
+        prompt = self._messages_to_prompt(messages, rag_context)
         
         return {
+            **_LLAMA_REQUEST_SKELETON,
             "prompt": prompt,
             "max_gen_len": max_tokens,
-            "temperature": temperature,
-            "top_p": 0.9
+            "temperature": temperature
         }
     
     def get_metrics(self) -> Dict:
         """Get current performance metrics"""
-        return self.metrics.copy()
+        metrics = self.metrics.copy()
+        total = metrics.pop("latency_sum")
+        requests_seen = metrics["total_requests"]
+        metrics["average_latency"] = total / requests_seen if requests_seen else 0.0
+        # Slots in use per model (held + queued); an autoscaling signal
+        metrics["model_queue_depth"] = {
+            model_id: self.model_configs[model_id]["max_concurrent"] - sem._value
+            for model_id, sem in self._model_sems.items()
+        }
+        return metrics
     
-    def get_available_models(self, tenant_id: str) -> List[Dict]:
+    async def get_available_models(self, tenant_id: str) -> List[Dict]:
         """Get list of available models for a specific tenant"""
-        tenant_config = asyncio.run(self._get_tenant_config(tenant_id))
+        tenant_config = await self._get_tenant_config(tenant_id)
         allowed_models = tenant_config.get("allowed_models", [])
-        
+
         available_models = []
         for model_id, config in self.model_configs.items():
             if model_id in allowed_models or "*" in allowed_models:
+                # Drop internal keys (request_builder) so the payload
+                # stays JSON-serializable
+                public_config = {
+                    k: v for k, v in config.items() if k != "request_builder"
+                }
                 available_models.append({
                     "id": model_id,
                     "name": model_id.split(".")[-1].replace("-", " ").title(),
                     "provider": config["provider"],
-                    "config": config,
+                    "config": public_config,
                     "max_concurrent": config["max_concurrent"],
                     "priority": config["priority"]
                 })
-        
+
         return available_models
     
     async def train_custom_model(
@@ -624,23 +1253,31 @@ class MultiProviderAIService:
             }
         }
         
-        # Make request to tenant cluster
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{cluster_endpoint}/api/v1/training",
-                json=payload,
-                timeout=3600  # 1 hour timeout for training
-            ) as response:
-                if response.status != 200:
-                    raise AIServiceError(f"Custom model training error: {response.status}")
-                
-                result = await response.json()
-                
-                # Store model information in tenant configuration
-                await self._store_custom_model_info(tenant_id, model_name, result)
-                
-                return result
+        # Make request to tenant cluster over the shared session
+        async with self._custom_session.post(
+            f"{cluster_endpoint}/api/v1/training",
+            json=payload,
+            timeout=aiohttp.ClientTimeout(total=3600)  # 1 hour timeout for training
+        ) as response:
+            if response.status != 200:
+                raise AIServiceError(f"Custom model training error: {response.status}")
+
+            result = await response.json()
+
+            # Store model information in tenant configuration
+            await self._store_custom_model_info(tenant_id, model_name, result)
+
+            return result
     
+    async def aclose(self):
+        """Release pooled connections on shutdown"""
+        await self._custom_session.close()
+        if self.huggingface_client:
+            await self.huggingface_client.close()
+        if self._bedrock_client is not None:
+            await self._bedrock_client.__aexit__(None, None, None)
+        await self.openai_client.close()
+
     async def _store_custom_model_info(self, tenant_id: str, model_name: str, model_info: Dict):
         """Store custom model information in tenant configuration"""
         # This would update the database with custom model information
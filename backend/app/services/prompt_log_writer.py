@@ -0,0 +1,97 @@
+import asyncio
+from typing import Dict, List, Optional
+
+import structlog
+from sqlalchemy import insert
+
+from app.core.database import SessionLocal
+from app.models.prompt_log import PromptLog
+
+logger = structlog.get_logger()
+
+# executemany requires every row in a batch to share one key set, but
+# callers enqueue different shapes (success, error, stream persist).
+# Rows are normalized to the full column set on enqueue; missing values
+# fall back to the column's scalar default, else NULL. id and
+# created_at stay server-generated.
+_COLUMN_DEFAULTS = {
+    c.name: (
+        c.default.arg
+        if c.default is not None and c.default.is_scalar
+        else None
+    )
+    for c in PromptLog.__table__.columns
+    if c.name not in ("id", "created_at")
+}
+
+class PromptLogWriter:
+    """Background writer that batches PromptLog inserts off the hot path"""
+
+    def __init__(
+        self,
+        max_batch: int = 500,
+        flush_interval: float = 0.05,
+        maxsize: int = 10_000
+    ):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Start the background flush task (called from app lifespan)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and drain whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+        rows = []
+        while not self.queue.empty():
+            rows.append(self.queue.get_nowait())
+        if rows:
+            await self._flush(rows)
+
+    async def enqueue(self, row: Dict):
+        """Queue one PromptLog row (column-name keyed dict) for insertion"""
+        await self.queue.put(
+            {name: row.get(name, default) for name, default in _COLUMN_DEFAULTS.items()}
+        )
+
+    async def _run(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            # Block for the first row, then collect more until the batch
+            # is full or the flush window closes
+            rows = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(rows) < self.max_batch:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    rows.append(await asyncio.wait_for(self.queue.get(), timeout=timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._flush(rows)
+
+    async def _flush(self, rows: List[Dict]):
+        try:
+            async with SessionLocal() as db:
+                await db.execute(insert(PromptLog), rows)
+                await db.commit()
+        except Exception as e:
+            logger.error(
+                "Failed to flush prompt logs",
+                error=str(e),
+                batch_size=len(rows)
+            )
+
+prompt_log_writer = PromptLogWriter()
@@ -1,15 +1,46 @@
+import asyncio
+import hashlib
 import chromadb
+from cachetools import LRUCache
 from chromadb.config import Settings
 import uuid
 from typing import List, Dict, Optional, Any
 import structlog
-from sentence_transformers import SentenceTransformer
 import os
 
 from app.core.config import settings
+from app.core.database import get_redis
+import numpy as np
+
+from app.services._embeddings import EmbedBatcher, OnnxEmbedder
 
 logger = structlog.get_logger()
 
+# Bulk-ingest sizing: rows per Chroma add (one index update + SQLite
+# commit per chunk) and texts per embedding forward pass
+_INGEST_CHUNK_SIZE = 5000
+_EMBED_BATCH_SIZE = 64
+
+# Bound on the query-embedding cache; repeated queries (FAQ traffic,
+# retry loops) skip the whole transformer forward on a hit
+_QUERY_CACHE_MAX_ENTRIES = 4096
+
+# Most-recently-used tenant collections kept alive; everything else is
+# re-fetched from Chroma on demand so thousands of tenants can't pin
+# HNSW graphs in memory forever
+_COLLECTION_CACHE_MAX_ENTRIES = 256
+
+# Corpora up to this size are searched by one brute-force BLAS matvec
+# over a resident matrix instead of a Chroma round-trip; above it the
+# HNSW index wins. Resident matrices are capped: 50k x 384 float32 is
+# ~75MB, so only a handful of tenants stay loaded.
+_BRUTE_FORCE_MAX_VECTORS = 50_000
+_MATRIX_CACHE_MAX_ENTRIES = 8
+
+def _clip(text: str, limit: int = 500) -> str:
+    """Truncate for metadata storage without copying short strings"""
+    return text if len(text) <= limit else text[:limit]
+
 class RAGService:
     """Service for Retrieval-Augmented Generation using ChromaDB"""
     
@@ -23,28 +54,61 @@ class RAGService:
             )
         )
         
-        # Initialize sentence transformer for embeddings
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
+        # INT8 ONNX embedder; embeddings are computed here and handed
+        # to Chroma directly so its default embedder never runs
+        self.embedder = OnnxEmbedder()
+
+        # Concurrent single-text embeds coalesce into one forward pass
+        self._embed_batcher = EmbedBatcher(self.embedder)
+
+        # blake2b(query) -> embedding
+        self._query_cache = LRUCache(maxsize=_QUERY_CACHE_MAX_ENTRIES)
         
-        # Collection cache
-        self._collections = {}
+        # Collection cache, LRU-bounded
+        self._collections = LRUCache(maxsize=_COLLECTION_CACHE_MAX_ENTRIES)
+
+        # Bound for concurrent fan-out calls (e.g. stats across tenants)
+        self._fanout_semaphore = asyncio.Semaphore(16)
+
+        # Per-tenant document counters live in Redis so stats reads are
+        # O(1) instead of a collection.count() scan
+        self.redis_client = get_redis()
+
+        # tenant_id -> {"matrix", "documents"} for small corpora, or
+        # False for tenants known to be too large for the fused path
+        self._matrices = LRUCache(maxsize=_MATRIX_CACHE_MAX_ENTRIES)
+
+        # Interned per-tenant where clauses; queries reuse one dict
+        # instead of allocating {"tenant_id": ...} per call. Treated as
+        # immutable — filters that add fields copy it first.
+        self._where_cache: Dict[str, Dict] = {}
     
     def _get_collection(self, tenant_id: str):
         """Get or create collection for tenant"""
-        if tenant_id not in self._collections:
-            try:
-                collection = self.chroma_client.get_collection(f"tenant_{tenant_id}")
-                self._collections[tenant_id] = collection
-            except:
-                # Create new collection if it doesn't exist
-                collection = self.chroma_client.create_collection(
-                    name=f"tenant_{tenant_id}",
-                    metadata={"tenant_id": tenant_id}
-                )
-                self._collections[tenant_id] = collection
-        
-        return self._collections[tenant_id]
+        collection = self._collections.get(tenant_id)
+        if collection is None:
+            # Inner-product space: every vector we store or query is
+            # already L2-normalized by the embedder, so ip distance
+            # (1 - a.b) equals cosine distance without the per-
+            # candidate norm/sqrt work in HNSW's inner loop, and
+            # 1 - distance in the query paths is still cosine
+            # similarity. Metadata only applies when the collection is
+            # first created. Connection errors propagate instead of
+            # being swallowed by a bare except.
+            collection = self.chroma_client.get_or_create_collection(
+                name=f"tenant_{tenant_id}",
+                metadata={"tenant_id": tenant_id, "hnsw:space": "ip"}
+            )
+            self._collections[tenant_id] = collection
+
+        return collection
+
+    def _tenant_where(self, tenant_id: str) -> Dict:
+        return self._where_cache.setdefault(tenant_id, {"tenant_id": tenant_id})
     
+    def _doc_count_key(self, tenant_id: str) -> str:
+        return f"stats:{tenant_id}:doc_count"
+
     async def store_interaction(
         self,
         prompt: str,
@@ -58,7 +122,7 @@ class RAGService:
             collection = self._get_collection(tenant_id)
             
             # Create document ID
-            doc_id = str(uuid.uuid4())
+            doc_id = uuid.uuid4().hex
             
             # Combine prompt and response for better retrieval
             combined_text = f"Question: {prompt}\nAnswer: {response}"
@@ -68,20 +132,29 @@ class RAGService:
                 "tenant_id": tenant_id,
                 "user_id": user_id,
                 "type": "interaction",
-                "prompt": prompt[:500],  # Truncate for storage
-                "response": response[:500]  # Truncate for storage
+                "prompt": _clip(prompt),  # Truncate for storage
+                "response": _clip(response)  # Truncate for storage
             }
             
             if metadata:
                 doc_metadata.update(metadata)
             
-            # Add to collection
-            collection.add(
+            # Add to collection with a precomputed embedding; the
+            # HNSW insert runs off the event loop. Chroma 0.4.x
+            # validates embeddings as plain lists, so ndarrays convert
+            # at the boundary.
+            embedding = await self._embed_batcher.embed(combined_text)
+            await asyncio.to_thread(
+                collection.add,
                 documents=[combined_text],
+                embeddings=[embedding.tolist()],
                 metadatas=[doc_metadata],
                 ids=[doc_id]
             )
             
+            await self.redis_client.incr(self._doc_count_key(tenant_id))
+            self._matrices.pop(tenant_id, None)
+
             logger.info(
                 "Stored interaction in RAG",
                 tenant_id=tenant_id,
@@ -108,7 +181,7 @@ class RAGService:
             collection = self._get_collection(tenant_id)
             
             # Create document ID
-            doc_id = str(uuid.uuid4())
+            doc_id = uuid.uuid4().hex
             
             # Prepare metadata
             doc_metadata = {
@@ -120,13 +193,20 @@ class RAGService:
             if metadata:
                 doc_metadata.update(metadata)
             
-            # Add to collection
-            collection.add(
+            # Add to collection with a precomputed embedding; the
+            # HNSW insert runs off the event loop
+            embedding = await self._embed_batcher.embed(content)
+            await asyncio.to_thread(
+                collection.add,
                 documents=[content],
+                embeddings=[embedding.tolist()],
                 metadatas=[doc_metadata],
                 ids=[doc_id]
             )
             
+            await self.redis_client.incr(self._doc_count_key(tenant_id))
+            self._matrices.pop(tenant_id, None)
+
             logger.info(
                 "Stored document in RAG",
                 tenant_id=tenant_id,
@@ -141,6 +221,120 @@ class RAGService:
                 error=str(e)
             )
     
+    async def store_documents(
+        self,
+        contents: List[str],
+        tenant_id: str,
+        titles: Optional[List[str]] = None,
+        metadata: Optional[Dict] = None
+    ) -> List[str]:
+        """Store many documents in one bulk ingest.
+
+        Embeddings run in 64-text forward passes and rows go to Chroma
+        in 5000-vector chunks, amortizing index updates and SQLite
+        commits across the batch instead of paying them per document.
+        The whole pipeline runs off the event loop. Returns the ids of
+        the stored documents."""
+        if not contents:
+            return []
+
+        def ingest() -> List[str]:
+            collection = self._get_collection(tenant_id)
+            all_ids: List[str] = []
+
+            for start in range(0, len(contents), _INGEST_CHUNK_SIZE):
+                chunk = contents[start:start + _INGEST_CHUNK_SIZE]
+
+                embeddings = np.concatenate([
+                    self.embedder.encode(chunk[i:i + _EMBED_BATCH_SIZE])
+                    for i in range(0, len(chunk), _EMBED_BATCH_SIZE)
+                ])
+
+                ids = [uuid.uuid4().hex for _ in chunk]
+                metadatas = []
+                for offset in range(len(chunk)):
+                    doc_metadata = {
+                        "tenant_id": tenant_id,
+                        "type": "document",
+                        "title": (
+                            titles[start + offset]
+                            if titles else "Untitled Document"
+                        )
+                    }
+                    if metadata:
+                        doc_metadata.update(metadata)
+                    metadatas.append(doc_metadata)
+
+                collection.add(
+                    documents=chunk,
+                    embeddings=embeddings.tolist(),
+                    metadatas=metadatas,
+                    ids=ids
+                )
+                all_ids.extend(ids)
+
+            return all_ids
+
+        try:
+            doc_ids = await asyncio.to_thread(ingest)
+            if doc_ids:
+                await self.redis_client.incrby(
+                    self._doc_count_key(tenant_id), len(doc_ids)
+                )
+                self._matrices.pop(tenant_id, None)
+
+            logger.info(
+                "Bulk stored documents in RAG",
+                tenant_id=tenant_id,
+                document_count=len(doc_ids)
+            )
+
+            return doc_ids
+
+        except Exception as e:
+            logger.error(
+                "Failed to bulk store documents in RAG",
+                tenant_id=tenant_id,
+                error=str(e)
+            )
+            return []
+
+    async def _embed_query(self, query: str):
+        """Embed a query, reusing the cached vector for repeats"""
+        key = hashlib.blake2b(query.encode(), digest_size=16).digest()
+        embedding = self._query_cache.get(key)
+        if embedding is None:
+            embedding = await self._embed_batcher.embed(query)
+            self._query_cache[key] = embedding
+        return embedding
+
+    def _load_matrix(self, tenant_id: str):
+        """Materialize a small tenant's corpus as one float32 matrix.
+
+        Returns False when the corpus is too large for brute force;
+        writes drop the cached entry so it rebuilds on the next query."""
+        collection = self._get_collection(tenant_id)
+        if collection.count() > _BRUTE_FORCE_MAX_VECTORS:
+            return False
+
+        data = collection.get(include=["embeddings", "documents"])
+        if not data["ids"]:
+            return {
+                "matrix": np.empty((0, 384), dtype=np.float32),
+                "documents": []
+            }
+        return {
+            "matrix": np.asarray(data["embeddings"], dtype=np.float32),
+            "documents": data["documents"]
+        }
+
+    async def _get_matrix(self, tenant_id: str):
+        entry = self._matrices.get(tenant_id)
+        if entry is None:
+            entry = await asyncio.to_thread(self._load_matrix, tenant_id)
+            self._matrices[tenant_id] = entry
+        return entry
+
     async def get_relevant_context(
         self,
         query: str,
@@ -150,24 +344,48 @@ class RAGService:
     ) -> Optional[str]:
         """Retrieve relevant context for a query"""
         try:
-            collection = self._get_collection(tenant_id)
-            
-            # Query the collection
-            results = collection.query(
-                query_texts=[query],
-                n_results=limit,
-                where={"tenant_id": tenant_id}
-            )
-            
-            if not results['documents'] or not results['documents'][0]:
-                return None
-            
-            # Filter by similarity threshold
-            relevant_docs = []
-            for i, distance in enumerate(results['distances'][0]):
-                similarity = 1 - distance  # Convert distance to similarity
-                if similarity >= similarity_threshold:
-                    relevant_docs.append(results['documents'][0][i])
+            entry = await self._get_matrix(tenant_id)
+
+            if entry is not False:
+                # Small corpus: one BLAS matvec over the resident
+                # matrix replaces the HNSW traversal and the Chroma
+                # wrapper layers. Vectors are unit-norm, so the scores
+                # are cosine similarities directly.
+                if not entry["documents"]:
+                    return None
+                query_embedding = await self._embed_query(query)
+                scores = entry["matrix"] @ np.asarray(
+                    query_embedding, dtype=np.float32
+                )
+                k = min(limit, scores.shape[0])
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[scores[top] >= similarity_threshold]
+                top = top[np.argsort(-scores[top])]
+                relevant_docs = [entry["documents"][i] for i in top]
+            else:
+                collection = self._get_collection(tenant_id)
+
+                # Query the collection; the HNSW search runs off the
+                # event loop
+                query_embedding = await self._embed_query(query)
+                results = await asyncio.to_thread(
+                    collection.query,
+                    query_embeddings=[query_embedding.tolist()],
+                    n_results=limit,
+                    where=self._tenant_where(tenant_id)
+                )
+
+                if not results['documents'] or not results['documents'][0]:
+                    return None
+
+                # Filter by similarity threshold with one vectorized
+                # comparison instead of a per-element Python loop
+                distances = np.asarray(results['distances'][0])
+                docs = results['documents'][0]
+                relevant_docs = [
+                    docs[i]
+                    for i in np.flatnonzero(distances <= 1 - similarity_threshold)
+                ]
             
             if not relevant_docs:
                 return None
@@ -192,7 +410,54 @@ class RAGService:
                 error=str(e)
             )
             return None
-    
+
+    async def get_relevant_context_many(
+        self,
+        queries: List[str],
+        tenant_id: str,
+        limit: int = 5,
+        similarity_threshold: float = 0.7
+    ) -> List[Optional[str]]:
+        """Retrieve relevant context for several queries in one pass.
+
+        All queries go through a single collection query, so a batch
+        costs one embedding forward pass instead of one per prompt.
+        Results come back index-aligned with the input."""
+        if not queries:
+            return []
+
+        try:
+            collection = self._get_collection(tenant_id)
+
+            embeddings = await asyncio.to_thread(
+                self.embedder.encode, list(queries)
+            )
+            results = await asyncio.to_thread(
+                collection.query,
+                query_embeddings=embeddings.tolist(),
+                n_results=limit,
+                where=self._tenant_where(tenant_id)
+            )
+
+            contexts: List[Optional[str]] = []
+            for docs, distances in zip(results['documents'], results['distances']):
+                keep = np.flatnonzero(
+                    np.asarray(distances) <= 1 - similarity_threshold
+                )
+                contexts.append(
+                    "\n\n".join(docs[i] for i in keep) if keep.size else None
+                )
+
+            return contexts
+
+        except Exception as e:
+            logger.error(
+                "Failed to retrieve batch context from RAG",
+                tenant_id=tenant_id,
+                error=str(e)
+            )
+            return [None] * len(queries)
+
     async def search_documents(
         self,
         query: str,
@@ -204,14 +469,18 @@ class RAGService:
         try:
             collection = self._get_collection(tenant_id)
             
-            # Build where clause
-            where_clause = {"tenant_id": tenant_id}
+            # Build where clause; the common untyped search reuses
+            # the interned tenant clause
+            where_clause = self._tenant_where(tenant_id)
             if doc_type:
-                where_clause["type"] = doc_type
-            
-            # Query the collection
-            results = collection.query(
-                query_texts=[query],
+                where_clause = {**where_clause, "type": doc_type}
+            
+            # Query the collection; the HNSW search runs off the
+            # event loop
+            query_embedding = await self._embed_query(query)
+            results = await asyncio.to_thread(
+                collection.query,
+                query_embeddings=[query_embedding.tolist()],
                 n_results=limit,
                 where=where_clause
             )
@@ -219,15 +488,23 @@ class RAGService:
             if not results['documents'] or not results['documents'][0]:
                 return []
             
-            # Format results
-            search_results = []
-            for i, doc in enumerate(results['documents'][0]):
-                search_results.append({
-                    "id": results['ids'][0][i],
+            # Format results; similarities come from one vectorized
+            # subtraction
+            similarities = 1 - np.asarray(results['distances'][0])
+            search_results = [
+                {
+                    "id": doc_id,
                     "content": doc,
-                    "metadata": results['metadatas'][0][i],
-                    "similarity": 1 - results['distances'][0][i]
-                })
+                    "metadata": doc_metadata,
+                    "similarity": float(similarity)
+                }
+                for doc_id, doc, doc_metadata, similarity in zip(
+                    results['ids'][0],
+                    results['documents'][0],
+                    results['metadatas'][0],
+                    similarities
+                )
+            ]
             
             logger.info(
                 "Searched documents in RAG",
@@ -250,8 +527,10 @@ class RAGService:
         """Delete a document from the vector database"""
         try:
             collection = self._get_collection(tenant_id)
-            collection.delete(ids=[doc_id])
-            
+            await asyncio.to_thread(collection.delete, ids=[doc_id])
+            await self.redis_client.decr(self._doc_count_key(tenant_id))
+            self._matrices.pop(tenant_id, None)
+
             logger.info(
                 "Deleted document from RAG",
                 tenant_id=tenant_id,
@@ -266,12 +545,29 @@ class RAGService:
                 error=str(e)
             )
     
+    async def get_collection_stats_many(self, tenant_ids: List[str]) -> List[Dict]:
+        """Fetch collection stats for many tenants with bounded concurrency"""
+        async def one(tenant_id: str) -> Dict:
+            async with self._fanout_semaphore:
+                return await self.get_collection_stats(tenant_id)
+
+        return await asyncio.gather(*(one(tenant_id) for tenant_id in tenant_ids))
+
     async def get_collection_stats(self, tenant_id: str) -> Dict:
         """Get statistics about the tenant's collection"""
         try:
-            collection = self._get_collection(tenant_id)
-            count = collection.count()
-            
+            # O(1) counter read; fall back to (and repair from) the
+            # full collection count if the counter is missing
+            count = await self.redis_client.get(self._doc_count_key(tenant_id))
+            if count is not None:
+                count = int(count)
+            else:
+                collection = self._get_collection(tenant_id)
+                count = await asyncio.to_thread(collection.count)
+                await self.redis_client.set(
+                    self._doc_count_key(tenant_id), count
+                )
+
             return {
                 "tenant_id": tenant_id,
                 "document_count": count,
@@ -289,3 +585,7 @@ class RAGService:
                 "document_count": 0,
                 "error": str(e)
             }
+
+# Shared instance: one ChromaDB client and one loaded embedding model
+# for the whole process instead of a copy per importing module
+rag_service = RAGService()
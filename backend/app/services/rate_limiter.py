@@ -1,4 +1,3 @@
-import redis
 import time
 from typing import Optional
 import structlog
@@ -8,12 +7,60 @@ from app.core.exceptions import RateLimitExceededError
 
 logger = structlog.get_logger()
 
+# Atomic sliding-window check over one sorted set per (tenant, user):
+# scores are admission timestamps in ms, so the hour count is the set
+# cardinality after pruning and the minute count a ZCOUNT over the
+# last 60s. One key per user instead of up to 120 fixed-window keys
+# per hour, no 2x bursts at window boundaries, and still a single
+# round trip per check. Carried entries are admissions the local fast
+# path already granted but hadn't flushed yet; a limit of 0 means
+# "window not enforced", and limits 0/0 turns the call into a pure
+# flush+recount. Members get a random suffix so same-millisecond
+# admissions don't collide.
+_CHECK_AND_ADMIT = """
+local now = tonumber(ARGV[1])
+local minute_limit = tonumber(ARGV[2])
+local hour_limit = tonumber(ARGV[3])
+local carry = tonumber(ARGV[4])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now - 3600000)
+for i = 1, carry do
+    redis.call('ZADD', KEYS[1], now, now .. '-c' .. i .. '-' .. math.random(2147483647))
+end
+local hour_count = redis.call('ZCARD', KEYS[1])
+local minute_count = redis.call('ZCOUNT', KEYS[1], now - 60000, now)
+if (minute_limit > 0 and minute_count >= minute_limit)
+    or (hour_limit > 0 and hour_count >= hour_limit) then
+    redis.call('PEXPIRE', KEYS[1], 3600000)
+    return {0, minute_count, hour_count}
+end
+if minute_limit > 0 or hour_limit > 0 then
+    redis.call('ZADD', KEYS[1], now, now .. '-0-' .. math.random(2147483647))
+    minute_count = minute_count + 1
+    hour_count = hour_count + 1
+end
+redis.call('PEXPIRE', KEYS[1], 3600000)
+return {1, minute_count, hour_count}
+"""
+
+# Local fast path: requests comfortably below the limit are admitted
+# from an in-process counter and only reconciled with Redis every
+# _LOCAL_FLUSH_EVERY admissions. Sliding-window counts only decay over
+# time, so a stale local count is pessimistic — it can under-admit,
+# never over-admit past the headroom. Once any worker sees 80% of a
+# limit, every request goes through the atomic script again.
+_LOCAL_HEADROOM = 0.8
+_LOCAL_FLUSH_EVERY = 10
+_LOCAL_MAX_ENTRIES = 4096
+
 class RateLimiter:
     """Rate limiting service using Redis"""
-    
+
     def __init__(self):
         self.redis_client = get_redis()
-    
+        self._check_and_admit = self.redis_client.register_script(_CHECK_AND_ADMIT)
+        # (tenant_id, user_id) -> [minute_count, hour_count, pending]
+        self._local: dict = {}
+
     async def check_rate_limit(
         self,
         tenant_id: str,
@@ -22,71 +69,98 @@ class RateLimiter:
         limit_per_hour: Optional[int] = None
     ) -> bool:
         """Check if user/tenant is within rate limits"""
-        
-        current_time = int(time.time())
-        
-        # Check per-minute limit
-        if limit_per_minute:
-            minute_key = f"rate_limit:{tenant_id}:{user_id}:minute:{current_time // 60}"
-            current_minute_count = self.redis_client.get(minute_key)
-            
-            if current_minute_count and int(current_minute_count) >= limit_per_minute:
-                logger.warning(
-                    "Rate limit exceeded (per minute)",
-                    tenant_id=tenant_id,
-                    user_id=user_id,
-                    limit=limit_per_minute
-                )
-                return False
-            
-            # Increment counter
-            pipe = self.redis_client.pipeline()
-            pipe.incr(minute_key)
-            pipe.expire(minute_key, 60)  # Expire after 1 minute
-            pipe.execute()
-        
-        # Check per-hour limit
-        if limit_per_hour:
-            hour_key = f"rate_limit:{tenant_id}:{user_id}:hour:{current_time // 3600}"
-            current_hour_count = self.redis_client.get(hour_key)
-            
-            if current_hour_count and int(current_hour_count) >= limit_per_hour:
-                logger.warning(
-                    "Rate limit exceeded (per hour)",
-                    tenant_id=tenant_id,
-                    user_id=user_id,
-                    limit=limit_per_hour
-                )
-                return False
-            
-            # Increment counter
-            pipe = self.redis_client.pipeline()
-            pipe.incr(hour_key)
-            pipe.expire(hour_key, 3600)  # Expire after 1 hour
-            pipe.execute()
-        
+
+        if not limit_per_minute and not limit_per_hour:
+            return True
+
+        key = f"rate_limit:{tenant_id}:{user_id}"
+        local_key = (tenant_id, user_id)
+        entry = self._local.get(local_key)
+
+        # Fast path: both windows known and well under their limits —
+        # admit locally without touching Redis, reconciling pending
+        # admissions in batches
+        if entry is not None:
+            under_minute = (
+                not limit_per_minute
+                or entry[0] + 1 < limit_per_minute * _LOCAL_HEADROOM
+            )
+            under_hour = (
+                not limit_per_hour
+                or entry[1] + 1 < limit_per_hour * _LOCAL_HEADROOM
+            )
+            if under_minute and under_hour:
+                entry[0] += 1
+                entry[1] += 1
+                entry[2] += 1
+                if entry[2] >= _LOCAL_FLUSH_EVERY:
+                    # Pure flush: push the batched admissions and adopt
+                    # the recounted (decayed, cross-worker) totals
+                    _, minute_count, hour_count = await self._check_and_admit(
+                        keys=[key],
+                        args=[int(time.time() * 1000), 0, 0, entry[2]]
+                    )
+                    self._store_local(local_key, minute_count, hour_count)
+                return True
+
+        # Slow path: cold entry or near a limit. The script carries any
+        # locally-admitted requests so the window catches up before the
+        # check, then admits this one atomically.
+        allowed, minute_count, hour_count = await self._check_and_admit(
+            keys=[key],
+            args=[
+                int(time.time() * 1000),
+                limit_per_minute or 0,
+                limit_per_hour or 0,
+                entry[2] if entry else 0
+            ]
+        )
+
+        # Counts from Redis are authoritative (they include other
+        # workers and time decay); reset the local view from them
+        self._store_local(local_key, minute_count, hour_count)
+
+        if not allowed:
+            logger.warning(
+                "Rate limit exceeded",
+                tenant_id=tenant_id,
+                user_id=user_id,
+                minute_count=minute_count,
+                hour_count=hour_count,
+                limit_per_minute=limit_per_minute,
+                limit_per_hour=limit_per_hour
+            )
+            return False
+
         return True
-    
+
+    def _store_local(self, key, minute_count: int, hour_count: int) -> None:
+        self._local[key] = [minute_count, hour_count, 0]
+        if len(self._local) > _LOCAL_MAX_ENTRIES:
+            self._local.pop(next(iter(self._local)))
+
     async def get_rate_limit_status(
         self,
         tenant_id: str,
         user_id: int
     ) -> dict:
         """Get current rate limit status for user/tenant"""
-        
-        current_time = int(time.time())
-        
-        # Get per-minute count
-        minute_key = f"rate_limit:{tenant_id}:{user_id}:minute:{current_time // 60}"
-        minute_count = self.redis_client.get(minute_key) or 0
-        
-        # Get per-hour count
-        hour_key = f"rate_limit:{tenant_id}:{user_id}:hour:{current_time // 3600}"
-        hour_count = self.redis_client.get(hour_key) or 0
-        
+
+        now_ms = int(time.time() * 1000)
+        key = f"rate_limit:{tenant_id}:{user_id}"
+
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.zremrangebyscore(key, 0, now_ms - 3600000)
+        pipe.zcount(key, now_ms - 60000, now_ms)
+        pipe.zcard(key)
+        _, minute_count, hour_count = await pipe.execute()
+
+        # Sliding windows have no fixed reset instant; report when the
+        # current windows will have fully decayed
+        current_time = now_ms // 1000
         return {
             "minute_count": int(minute_count),
             "hour_count": int(hour_count),
-            "minute_reset": (current_time // 60 + 1) * 60,
-            "hour_reset": (current_time // 3600 + 1) * 3600
+            "minute_reset": current_time + 60,
+            "hour_reset": current_time + 3600
         }
@@ -0,0 +1,84 @@
+import asyncio
+import uuid
+from typing import Optional
+
+import structlog
+
+from app.services.rag_service import rag_service
+
+logger = structlog.get_logger()
+
+class SemanticCache:
+    """Semantic response cache backed by the shared ChromaDB instance.
+
+    Near-identical prompts from the same tenant and model are served
+    from the cache, skipping the Bedrock round trip entirely. Lookups
+    and stores never raise: a cache failure degrades to a normal LLM
+    call.
+    """
+
+    def __init__(self, similarity_threshold: float = 0.95):
+        self.similarity_threshold = similarity_threshold
+        # Cosine space, so 1 - distance below really is the similarity
+        # the threshold is compared against (the default l2 space would
+        # make that arithmetic meaningless)
+        self.collection = rag_service.chroma_client.get_or_create_collection(
+            name="semantic_response_cache",
+            metadata={"type": "semantic_cache", "hnsw:space": "cosine"}
+        )
+
+    async def get(self, prompt: str, tenant_id: str, model: str) -> Optional[str]:
+        """Return a cached response for a semantically similar prompt"""
+        try:
+            # Chroma's API is synchronous; run it off the event loop
+            # like rag_service does
+            results = await asyncio.to_thread(
+                self.collection.query,
+                query_texts=[prompt],
+                n_results=1,
+                where={"$and": [{"tenant_id": tenant_id}, {"model": model}]}
+            )
+            if not results["documents"] or not results["documents"][0]:
+                return None
+
+            similarity = 1 - results["distances"][0][0]
+            if similarity < self.similarity_threshold:
+                return None
+
+            logger.info(
+                "Semantic cache hit",
+                tenant_id=tenant_id,
+                model=model,
+                similarity=similarity
+            )
+            return results["metadatas"][0][0]["response"]
+
+        except Exception as e:
+            logger.warning(
+                "Semantic cache lookup failed",
+                tenant_id=tenant_id,
+                error=str(e)
+            )
+            return None
+
+    async def put(self, prompt: str, tenant_id: str, model: str, response: str):
+        """Store a completed response keyed by the prompt embedding"""
+        try:
+            await asyncio.to_thread(
+                self.collection.add,
+                documents=[prompt],
+                metadatas=[{
+                    "tenant_id": tenant_id,
+                    "model": model,
+                    "response": response
+                }],
+                ids=[str(uuid.uuid4())]
+            )
+        except Exception as e:
+            logger.warning(
+                "Semantic cache store failed",
+                tenant_id=tenant_id,
+                error=str(e)
+            )
+
+semantic_cache = SemanticCache()
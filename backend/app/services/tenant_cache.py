@@ -0,0 +1,88 @@
+import asyncio
+import json
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import structlog
+from cachetools import TTLCache
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.enterprise_config import enterprise_settings
+from app.models.tenant import Tenant
+
+logger = structlog.get_logger()
+
+@dataclass(slots=True)
+class CachedTenant:
+    """Lightweight snapshot of a tenant row, safe to hold across sessions"""
+    id: int
+    name: str
+    default_model: str
+    is_active: bool
+
+# Process-local TTL cache for the hot tenant-by-name lookup, backed by
+# a Redis layer shared across workers
+_cache: TTLCache = TTLCache(maxsize=1024, ttl=60)
+_lock = asyncio.Lock()
+
+def _redis_key(name: str) -> str:
+    return f"tenant:by_name:{name}"
+
+async def get_tenant_by_name(db: AsyncSession, name: str) -> Optional[CachedTenant]:
+    """Get a tenant by name, served from cache when possible"""
+    async with _lock:
+        cached = _cache.get(name)
+    if cached is not None:
+        return cached
+    return await _load_and_cache(db, name)
+
+async def resolve_tenant(name: str) -> Optional[CachedTenant]:
+    """Cache-first tenant lookup that owns its session on a miss.
+
+    For callers without a request-scoped session, e.g. middleware."""
+    async with _lock:
+        cached = _cache.get(name)
+    if cached is not None:
+        return cached
+
+    from app.core.database import SessionLocal
+
+    async with SessionLocal() as db:
+        return await _load_and_cache(db, name)
+
+async def _load_and_cache(db: AsyncSession, name: str) -> Optional[CachedTenant]:
+    from app.core.database import redis_client
+
+    # Second level: Redis, shared across workers
+    raw = await redis_client.get(_redis_key(name))
+    if raw:
+        cached = CachedTenant(**json.loads(raw))
+    else:
+        result = await db.execute(select(Tenant).where(Tenant.name == name))
+        tenant = result.scalars().first()
+        if tenant is None:
+            return None
+
+        cached = CachedTenant(
+            id=tenant.id,
+            name=tenant.name,
+            default_model=tenant.default_model,
+            is_active=tenant.is_active
+        )
+        await redis_client.setex(
+            _redis_key(name),
+            enterprise_settings.CACHE_TTL,
+            json.dumps(asdict(cached))
+        )
+
+    async with _lock:
+        _cache[name] = cached
+    return cached
+
+async def invalidate_tenant(name: str):
+    """Drop a tenant from both cache layers after a mutation"""
+    from app.core.database import redis_client
+
+    _cache.pop(name, None)
+    await redis_client.delete(_redis_key(name))
@@ -0,0 +1,82 @@
+"""
+Tests for the batched prompt log writer
+"""
+import asyncio
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+import app.services.prompt_log_writer as prompt_log_writer_module
+from app.core.database import Base
+from app.models import chat_message, conversation, prompt_log, tenant, user  # noqa: F401
+from app.models.prompt_log import PromptLog
+from app.services.prompt_log_writer import PromptLogWriter
+
+def test_flush_mixed_success_and_error_rows(monkeypatch):
+    """One batch mixing the success and error row shapes inserts both"""
+    async def run():
+        engine = create_async_engine(
+            "sqlite+aiosqlite://",
+            poolclass=StaticPool,
+            connect_args={"check_same_thread": False}
+        )
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        monkeypatch.setattr(
+            prompt_log_writer_module, "SessionLocal", session_factory
+        )
+
+        writer = PromptLogWriter()
+        # Success shape (chat endpoint) and error shape (exception
+        # handler) enqueued into the same flush window
+        await writer.enqueue({
+            "tenant_id": 1,
+            "user_id": 1,
+            "prompt_text": "hello",
+            "response_text": "hi there",
+            "model_used": "claude-3-haiku",
+            "input_tokens": 5,
+            "output_tokens": 3,
+            "total_tokens": 8,
+            "latency_ms": 12.5,
+            "cost_usd": 0.0001,
+            "request_id": "req-success",
+            "user_agent": "pytest",
+            "ip_address": "127.0.0.1",
+            "status_code": 200,
+            "cache_hit": True
+        })
+        await writer.enqueue({
+            "tenant_id": 1,
+            "user_id": 1,
+            "prompt_text": "hello",
+            "model_used": "claude-3-haiku",
+            "request_id": "req-error",
+            "user_agent": "pytest",
+            "ip_address": "127.0.0.1",
+            "status_code": 500,
+            "error_message": "boom"
+        })
+
+        rows = [writer.queue.get_nowait(), writer.queue.get_nowait()]
+        await writer._flush(rows)
+
+        async with session_factory() as db:
+            logs = (
+                await db.execute(
+                    select(PromptLog).order_by(PromptLog.status_code)
+                )
+            ).scalars().all()
+
+        assert [log.request_id for log in logs] == ["req-success", "req-error"]
+        assert logs[0].cache_hit is True
+        # Normalization fills missing columns from their defaults
+        assert logs[1].cache_hit is False
+        assert logs[1].response_text is None
+        assert logs[1].error_message == "boom"
+
+        await engine.dispose()
+
+    asyncio.run(run())